@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Measures scan time of a large deflated jar with a varying number of inflater threads.
+
+Usage: python -m benchmarks.bench_inflate_workers [entries] [workers...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from coffea.builder import Builder
+from coffea.java.java_scanner import JavaScanner
+from coffea.java.tests import __file__ as java_test_directory
+
+data_dir = os.path.join(os.path.dirname(java_test_directory), 'data')
+
+def create_jar(path, entries):
+    """Creates a deflated jar with the sample classes copied under different names."""
+    samples = []
+    for name in ['SimplePOJO.class', 'Java8Sample.class']:
+        with open(os.path.join(data_dir, name), 'rb') as f:
+            samples.append(f.read())
+    
+    zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    for i in xrange(entries):
+        # Repeat the sample to get realistically sized entries (the parser ignores trailing data)
+        zf.writestr('com/example/p%d/Sample%d.class' % (i % 100, i), samples[i % 2] * 4 + str(i))
+    zf.close()
+
+def measure(label, action):
+    start = time.time()
+    action()
+    elapsed = time.time() - start
+    print '%-28s %8.3fs' % (label, elapsed)
+    return elapsed
+
+def main(entries, workers_list):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        jar = os.path.join(tmp_dir, 'large.jar')
+        create_jar(jar, entries)
+        print 'Jar: %d entries, %.1f MB (CPUs: %s)' % (entries, os.path.getsize(jar) / 1048576.0, _cpu_count())
+        
+        def scan(workers):
+            with JavaScanner(workers=workers) as scanner:
+                for record in scanner.iter_classes(jar):
+                    pass
+        
+        def build(workers):
+            Builder(workers=workers).append(jar)
+
+        baseline = measure('scan (inflate only) w=0', lambda: scan(0))
+        for workers in workers_list:
+            elapsed = measure('scan (inflate only) w=%d' % workers, lambda: scan(workers))
+            print '%-28s %8.2fx' % ('  speedup', baseline / elapsed)
+        
+        baseline = measure('build (inflate+parse) w=0', lambda: build(0))
+        for workers in workers_list:
+            elapsed = measure('build (inflate+parse) w=%d' % workers, lambda: build(workers))
+            print '%-28s %8.2fx' % ('  speedup', baseline / elapsed)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return '?'
+
+if __name__ == '__main__':
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers_list = map(int, sys.argv[2:]) if len(sys.argv) > 2 else [1, 2, 4]
+    main(entries, workers_list)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Measures scan and parse time of an exploded class tree, reading loose class files on demand 
+(one string per file) or into the scanner's reusable buffer (read_files).
+
+Usage: python -m benchmarks.bench_loose_classes [files]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from coffea.java.java_class import JavaClass, PARSE_DEPENDENCIES
+from coffea.java.java_scanner import JavaScanner
+from coffea.java.tests import __file__ as java_test_directory
+
+data_dir = os.path.join(os.path.dirname(java_test_directory), 'data')
+
+def create_tree(root, files):
+    """Creates a WEB-INF/classes tree with the sample classes copied under different names."""
+    samples = []
+    for name in ['SimplePOJO.class', 'Java8Sample.class']:
+        with open(os.path.join(data_dir, name), 'rb') as f:
+            samples.append(f.read())
+
+    classes_dir = os.path.join(root, 'WEB-INF', 'classes')
+    for i in xrange(files):
+        package_dir = os.path.join(classes_dir, 'com', 'example', 'p%d' % (i % 1000))
+        if i < 1000:
+            os.makedirs(package_dir)
+        # The parser ignores trailing data - vary the size a little
+        with open(os.path.join(package_dir, 'Sample%d.class' % i), 'wb') as f:
+            f.write(samples[i % 2] + str(i))
+
+def measure(label, action, repeat=3):
+    """Runs action repeatedly and reports the best time (parsing dominates and is noisy)."""
+    elapsed = None
+    for i in xrange(repeat):
+        start = time.time()
+        action()
+        elapsed = min(elapsed, time.time() - start) if elapsed is not None else time.time() - start
+    print '%-28s %8.3fs' % (label, elapsed)
+    return elapsed
+
+def main(files):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        create_tree(tmp_dir, files)
+        print 'Tree: %d class files' % files
+
+        def read(read_files):
+            with JavaScanner(read_files=read_files) as scanner:
+                for record in scanner.iter_classes(tmp_dir):
+                    if record.data is None:
+                        with open(record.origin, 'rb') as f:
+                            f.read()
+
+        def parse(read_files):
+            with JavaScanner(read_files=read_files) as scanner:
+                for record in scanner.iter_classes(tmp_dir):
+                    if record.data is None:
+                        JavaClass(record.origin, mode=PARSE_DEPENDENCIES)
+                    else:
+                        JavaClass.from_bytes(record.data, record.origin, mode=PARSE_DEPENDENCIES)
+
+        baseline = measure('read (on demand)', lambda: read(False))
+        elapsed = measure('read (read_files)', lambda: read(True))
+        print '%-28s %8.2fx' % ('  speedup', baseline / elapsed)
+
+        baseline = measure('read+parse (on demand)', lambda: parse(False))
+        elapsed = measure('read+parse (read_files)', lambda: parse(True))
+        print '%-28s %8.2fx' % ('  speedup', baseline / elapsed)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    main(files)
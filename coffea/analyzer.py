@@ -46,10 +46,11 @@ class Analyzer(object):
     def _build_graph(self, model):
         log.debug('Building NetworkX graph...')
         graph = nx.DiGraph()
-        for node in model.nodes:
+        nodes = model.nodes
+        for node in nodes:
             graph.add_node(node.id, size=node.size)
     
-        for node in model.nodes:
+        for node in nodes:
             for conn in node.connections:
                 graph.add_edge(node.id, conn) 
 
@@ -21,44 +21,156 @@ import logging
 import os
 import sys
 
-from java.java_class import JavaClass
-from java.java_scanner import JavaScanner 
+from java.artifact import ArtifactIndex, read_artifacts
+from java.java_class import JavaClass, PARSE_CODE_SIZE, PARSE_DEPENDENCIES
+from java.java_scanner import JavaScanner
 
-from model import Model, Node
+from hierarchy import HierarchyIndex
+from model import CompactModel, Model, Node
+from symbols import symbols
 
 log = logging.getLogger('builder')
 
+# Maximum number of classes kept in the class cache
+CLASS_CACHE_SIZE = 16384
+
 class Builder(object):
     """Dependency model builder."""
     
-    def __init__(self, node_factory=None):
-        """Initializes a new instance of the Builder class."""
-        self.model = Model()
+    def __init__(self, node_factory=None, workers=0, class_cache=False, path_filter=None, release=None, quarantine=None):
+        """Initializes a new instance of the Builder class.
+
+        If workers is set, archives are read by that many threads (largest first). If class_cache 
+        is set, archive entries with a known content fingerprint (the same class bundled in 
+        several libraries) are not parsed again - the node built for the first copy is reused 
+        (at most class_cache_size classes are kept). 
+        Directories, archives and classes rejected by path_filter (a PathFilter) are skipped. 
+        Multi-release jars contribute the class versions selected for release (base versions 
+        if not set). If quarantine (a coffea.quarantine.Quarantine) is set, classes and archives 
+        that fail to load are recorded there and skipped (continue-on-error mode)."""
         self.node_factory = node_factory if node_factory is not None else ClassNodeFactory()
+        self.model = self.node_factory.create_model()
+        self.hierarchy = HierarchyIndex()
+        self.workers = workers
+        self.class_cache = {} if class_cache else None
+        self.class_cache_size = CLASS_CACHE_SIZE
+        self.class_cache_hits = 0
+        self.class_cache_misses = 0
+        self.path_filter = path_filter
+        self.release = release
+        self.quarantine = quarantine
+        self.artifacts = []
     
     def append(self, root_path):
         """Appends artifacts from the specified path to the underlying model."""
         
         log.info('Scanning path: %s', root_path)
 
+        if isinstance(self.node_factory, ArtifactNodeFactory):
+            self._append_artifacts(root_path)
+            return
+
         classes = 0
-        with JavaScanner(self._process_class) as scanner:
-            classes = scanner.scan(root_path)
+        # Merging is order independent - let the scanner deliver classes as soon as they are ready
+        with JavaScanner(workers=self.workers, ordered=False, path_filter=self.path_filter, 
+                         class_filter=self._class_filter(), release=self.release, quarantine=self.quarantine, 
+                         read_files=True) as scanner:
+            for record in scanner.iter_classes(root_path):
+                self._process_class(record)
+                classes += 1
+            duplicates = len(scanner.duplicates)
+            pruned = scanner.pruned
+            rejected = scanner.rejected
+            superseded = scanner.superseded
             
-        log.info('Scan finished. Found %d class files.', classes)
-
-    def _process_class(self, path):
-        node = self.node_factory.get_node(JavaClass(path))
-        log.debug('Processing node: %s', node)
-        self.model.merge(node)
+        log.info('Scan finished. Found %d class files (skipped %d duplicate archives, %d filtered paths, %d filtered classes, %d superseded versions).', 
+                 classes, duplicates, pruned, rejected, superseded)
+        if self.class_cache is not None:
+            log.info('Class cache: %d hits, %d misses.', self.class_cache_hits, self.class_cache_misses)
+
+    def _append_artifacts(self, root_path):
+        """Reads archive metadata only and relinks the artifact graph."""
+        artifacts = len(self.artifacts)
+        with JavaScanner(path_filter=self.path_filter, quarantine=self.quarantine) as scanner:
+            for origin, archive in scanner.iter_archives(root_path):
+                try:
+                    self.artifacts.extend(read_artifacts(archive, origin))
+                except Exception as e:
+                    if self.quarantine is None:
+                        raise
+                    self.quarantine.add(origin, e, getattr(e, 'offset', None))
+            duplicates = len(scanner.duplicates)
+        log.info('Scan finished. Found %d artifacts (skipped %d duplicate archives).', len(self.artifacts) - artifacts, duplicates)
+
+        # References may point to artifacts appended before or after - link everything again
+        index = ArtifactIndex(self.artifacts)
+        self.model.clear()
+        for artifact in self.artifacts:
+            node = self.node_factory.get_node(artifact, index)
+            log.debug('Processing node: %s', node)
+            self.model.merge(node)
+
+    def _class_filter(self):
+        """Returns a function that rejects classes by name before they are parsed (None if there are no node filters)."""
+        if not self.model.node_filters:
+            return None
+        get_node_id = self.node_factory.get_node_id
+        accepts = self.model.accepts
+        return lambda class_name: accepts(get_node_id(class_name))
+
+    def _process_class(self, record):
+        fingerprint = record.fingerprint
+        if fingerprint is not None and self.class_cache is not None:
+            cached = self.class_cache.get(fingerprint)
+            if cached is not None:
+                self.class_cache_hits += 1
+                for node_args in cached:
+                    node = Node(*node_args)
+                    log.debug('Processing node: %s (cached)', node)
+                    self.model.merge(node)
+                return
+            self.class_cache_misses += 1
+
+        try:
+            if record.data is None:
+                java_class = JavaClass(record.origin, mode=self.node_factory.parse_mode)
+            else:
+                java_class = JavaClass.from_bytes(record.data, record.origin, mode=self.node_factory.parse_mode)
+            nodes = self.node_factory.get_nodes(java_class)
+        except Exception as e:
+            if self.quarantine is None:
+                raise
+            self.quarantine.add(record.origin, e, getattr(e, 'offset', None))
+            return
+        self.hierarchy.add_class(java_class)
+        if fingerprint is not None and self.class_cache is not None:
+            if len(self.class_cache) >= self.class_cache_size:
+                self.class_cache.popitem()
+            # Model filters and merge() replace node attributes, never update them - keep the original values
+            self.class_cache[fingerprint] = [(it.id, it.connections, it.size) for it in nodes]
+        for node in nodes:
+            log.debug('Processing node: %s', node)
+            self.model.merge(node)
     
 
 class NodeFactory(object):
     """Node factory."""
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, size_property=None):
+    def __init__(self, size_property=None, descriptors=False):
         self.size_property = size_property
+        self.descriptors = descriptors
+
+    def create_model(self):
+        """Creates a Model instance suitable for nodes produced by this factory."""
+        return Model()
+
+    @property
+    def parse_mode(self):
+        """Returns the cheapest JavaClass parse mode that covers this factory."""
+        if self.size_property == 'code':
+            return PARSE_CODE_SIZE
+        return PARSE_DEPENDENCIES
 
     def _get_size(self, java_class):
         if self.size_property == None:
@@ -75,20 +187,68 @@ class NodeFactory(object):
         """Converts a JavaClass instance to a Node instance."""
         pass
 
+    def get_nodes(self, java_class):
+        """Returns all nodes contributed by a JavaClass instance (the class node first)."""
+        return [self.get_node(java_class)]
+
+    def get_node_id(self, class_name):
+        """Returns the id of the node produced for a class (without parsing it)."""
+        return class_name
+
 class PackageNodeFactory(NodeFactory):
     """A NodeFactory for package dependency analysys."""
 
+    def get_node_id(self, class_name):
+        return class_name.rpartition('.')[0]
+
     def get_node(self, java_class):
-        return Node(java_class.package, java_class.package_dependencies(), self._get_size(java_class))
+        return Node(symbols.intern(java_class.package), java_class.package_dependencies(sort=False, descriptors=self.descriptors), self._get_size(java_class))
 
     def __repr__(self):
-        return 'PackageNodeFactory: size_property=%s' % self.size_property
+        return 'PackageNodeFactory: size_property=%s descriptors=%s' % (self.size_property, self.descriptors)
 
 class ClassNodeFactory(NodeFactory):
     """A NodeFactory for class dependency analysys."""
     
     def get_node(self, java_class):
-        return Node(java_class.name, java_class.class_dependencies(), self._get_size(java_class))
+        return Node(symbols.intern(java_class.name), java_class.class_dependencies(sort=False, descriptors=self.descriptors), self._get_size(java_class))
+
+    def __repr__(self):
+        return 'ClassNodeFactory: size_property=%s descriptors=%s' % (self.size_property, self.descriptors)
+
+class ArtifactNodeFactory(NodeFactory):
+    """A NodeFactory for artifact (archive to archive) dependency analysis.
+
+    Nodes are built from archive metadata only: manifest Class-Path, Require-Bundle, 
+    Import-Package and Export-Package headers and module descriptors (requires, exports). 
+    No class is parsed. If a size property is set, the node size is the number of classes."""
+
+    def get_node(self, artifact, index):
+        """Converts an Artifact to a Node, resolving references with an ArtifactIndex."""
+        return Node(symbols.intern(artifact.id), index.dependencies(artifact), artifact.classes if self.size_property is not None else 0)
+
+    def __repr__(self):
+        return 'ArtifactNodeFactory: size_property=%s' % self.size_property
+
+class MemberNodeFactory(NodeFactory):
+    """A NodeFactory for member (field and method) dependency analysys. 
+
+    Produces one node per class, connected to the referenced members of other classes 
+    (Owner#field, Owner#method(descriptor)), and one node per declared member, so that 
+    references to members of scanned classes are internal. Uses a CompactModel to keep the 
+    much larger graph in memory."""
+
+    def create_model(self):
+        return CompactModel()
+    
+    def get_node(self, java_class):
+        return Node(symbols.intern(java_class.name), java_class.member_dependencies(sort=False), self._get_size(java_class))
+
+    def get_nodes(self, java_class):
+        owner = java_class.name + '#'
+        members = [owner + it.name for it in java_class.fields]
+        members.extend(owner + it.name + it.descriptor for it in java_class.methods)
+        return [self.get_node(java_class)] + [Node(symbols.intern(it)) for it in members]
 
     def __repr__(self):
-        return 'ClassNodeFactory: size_property=%s' % self.size_property
+        return 'MemberNodeFactory: size_property=%s' % self.size_property
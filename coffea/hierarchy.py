@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import threading
+
+from array import array
+
+from symbols import symbols
+
+log = logging.getLogger('hierarchy')
+
+class HierarchyIndex(object):
+    """A thread-safe class hierarchy index (super classes and implemented interfaces).
+
+    Parent and child adjacency is stored as arrays of symbol table ids. Transitive 
+    queries visit each related class once, i.e. run in time proportional to the result.
+    """
+
+    def __init__(self, symbol_table=None):
+        """Initializes a new instance of the HierarchyIndex class."""
+        self._lock = threading.Lock()
+        self._symbols = symbol_table if symbol_table is not None else symbols
+        self._parents = {}
+        self._children = {}
+
+    def __len__(self):
+        """Returns the number of indexed classes."""
+        return len(self._parents)
+
+    def __contains__(self, class_name):
+        return class_name in self._symbols and self._symbols.id(class_name) in self._parents
+
+    def add(self, class_name, super_name=None, interfaces=[]):
+        """Records a class along with its direct super class and interfaces."""
+        symbol_id = self._symbols.id
+        class_id = symbol_id(class_name)
+        parent_ids = [symbol_id(it) for it in interfaces]
+        if super_name is not None:
+            parent_ids.insert(0, symbol_id(super_name))
+
+        with self._lock:
+            known_parents = self._parents.get(class_id)
+            if known_parents is None:
+                known_parents = self._parents[class_id] = array('I')
+            for parent_id in parent_ids:
+                # The same class may be found in several artifacts
+                if parent_id in known_parents:
+                    continue
+                known_parents.append(parent_id)
+                children = self._children.get(parent_id)
+                if children is None:
+                    children = self._children[parent_id] = array('I')
+                children.append(class_id)
+
+    def add_class(self, java_class):
+        """Records a JavaClass instance."""
+        self.add(java_class.name, java_class.super_name, java_class.interfaces)
+
+    def parents(self, class_name):
+        """Returns direct super types of the specified class."""
+        return self._adjacent(self._parents, class_name)
+
+    def children(self, class_name):
+        """Returns direct sub types of the specified class."""
+        return self._adjacent(self._children, class_name)
+
+    def supertypes(self, class_name):
+        """Returns all (transitive) super types of the specified class."""
+        return self._closure(self._parents, class_name)
+
+    def subtypes(self, class_name):
+        """Returns all (transitive) sub types of the specified class."""
+        return self._closure(self._children, class_name)
+
+    def _adjacent(self, adjacency, class_name):
+        if class_name not in self._symbols:
+            return set()
+        name = self._symbols.name
+        return set(name(it) for it in adjacency.get(self._symbols.id(class_name), ()))
+
+    def _closure(self, adjacency, class_name):
+        if class_name not in self._symbols:
+            return set()
+        
+        visited = set()
+        stack = [self._symbols.id(class_name)]
+        while stack:
+            for related_id in adjacency.get(stack.pop(), ()):
+                if related_id not in visited:
+                    visited.add(related_id)
+                    stack.append(related_id)
+        
+        name = self._symbols.name
+        return set(name(it) for it in visited)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import os
+import re
+import urllib
+
+from collections import namedtuple
+
+from java_class import JavaClass, PARSE_DEPENDENCIES
+from jimage_reader import JImageReader
+
+log = logging.getLogger('artifact')
+
+_CLASS_SUFFIX = '.class'
+_BUNDLE_SUFFIX = '.zip'
+_MODULE_INFO = 'module-info.class'
+_JMOD_MODULE_INFO = 'classes/module-info.class'
+_PATTERN_VERSIONED_MODULE_INFO = re.compile(r'META-INF/versions/(\d+)/module-info\.class$')
+
+# OSGi header clauses (comma separated) and their parts (semicolon separated) - separators in quoted values do not count
+_PATTERN_CLAUSE = re.compile(r'(?:[^,"]|"[^"]*")+')
+_PATTERN_CLAUSE_PART = re.compile(r'(?:[^;"]|"[^"]*")+')
+
+# Archive metadata. id is the archive file name (a module name for modules of the JDK runtime image), 
+# module the module name (module-info, Automatic-Module-Name or Bundle-SymbolicName), class_path the 
+# file names listed in the Class-Path manifest header, requires the required modules and bundles, 
+# exports and imports package names. classes is the number of class entries.
+Artifact = namedtuple('Artifact', 'id origin module class_path requires exports imports classes')
+
+def header_names(value):
+    """Returns the names (packages, bundles) listed in an OSGi manifest header, without attributes and directives."""
+    names = []
+    for clause in _PATTERN_CLAUSE.findall(value):
+        for part in _PATTERN_CLAUSE_PART.findall(clause):
+            part = part.strip()
+            # Names come first, attributes (version=...) and directives (resolution:=...) follow
+            if '=' in part:
+                break
+            if part:
+                names.append(part)
+    return names
+
+def read_artifacts(archive, origin):
+    """Returns the artifacts described by the metadata of an open archive.
+
+    A jar, war, ear or jmod file is a single artifact, the JDK runtime image holds one per 
+    module. A zip file is an artifact only if it holds classes (otherwise it is a distribution 
+    bundle). Only the manifest and the module descriptor are read (and the entry list)."""
+    if isinstance(archive, JImageReader):
+        return _read_image_modules(archive, origin)
+
+    classes = sum(1 for it in archive if it.name.endswith(_CLASS_SUFFIX))
+    if classes == 0 and origin.endswith(_BUNDLE_SUFFIX):
+        return []
+
+    manifest = archive.manifest()
+    module = _read_module(archive, _find_module_info(archive), origin)
+
+    requires = header_names(manifest.get('require-bundle', ''))
+    exports = header_names(manifest.get('export-package', ''))
+    if module is not None:
+        module_name = module.name
+        requires = module.requires + requires
+        exports = module.exports + exports
+    else:
+        module_name = manifest.get('automatic-module-name') or next(iter(header_names(manifest.get('bundle-symbolicname', ''))), None)
+
+    class_path = []
+    for url in manifest.get('class-path', '').split():
+        # Relative URLs - only the file name identifies the artifact
+        if not url.endswith('/'):
+            class_path.append(urllib.unquote(url.rpartition('/')[2]))
+
+    artifact_id = os.path.basename(origin.rpartition('!/')[2])
+    log.debug('Artifact: %s module=%s class_path=%d requires=%d exports=%d', origin, module_name, len(class_path), len(requires), len(exports))
+    return [Artifact(artifact_id, origin, module_name, class_path, requires, exports, 
+                     header_names(manifest.get('import-package', '')), classes)]
+
+def _find_module_info(archive):
+    """Returns the module descriptor entry of a jar or jmod file (the highest versioned one if there is no base one)."""
+    entry = archive.find(_JMOD_MODULE_INFO if archive.jmod else _MODULE_INFO)
+    if entry is None:
+        versions = []
+        for it in archive:
+            match = _PATTERN_VERSIONED_MODULE_INFO.match(it.name)
+            if match is not None:
+                versions.append((int(match.group(1)), it))
+        if versions:
+            entry = max(versions)[1]
+    return entry
+
+def _read_module(archive, entry, origin):
+    if entry is None:
+        return None
+    return JavaClass.from_bytes(archive.read(entry), origin + '!/' + entry.name, mode=PARSE_DEPENDENCIES).module
+
+def _read_image_modules(archive, origin):
+    classes = {}
+    module_infos = []
+    for entry in archive:
+        if entry.name.endswith(_CLASS_SUFFIX):
+            classes[entry.module] = classes.get(entry.module, 0) + 1
+            if entry.name == entry.module + '/' + _MODULE_INFO:
+                module_infos.append(entry)
+
+    artifacts = []
+    for entry in module_infos:
+        module = _read_module(archive, entry, origin)
+        if module is not None:
+            artifacts.append(Artifact(module.name, origin + '!/' + entry.module, module.name, [], module.requires, module.exports, [], 
+                                      classes[entry.module]))
+    return artifacts
+
+class ArtifactIndex(object):
+    """Resolves artifact references (class path entries, required modules and bundles, imported packages) to artifact ids."""
+
+    def __init__(self, artifacts):
+        """Initializes a new instance of the ArtifactIndex class. The first artifact providing a module or a package wins."""
+        self._modules = {}
+        self._packages = {}
+        for artifact in artifacts:
+            if artifact.module is not None:
+                self._modules.setdefault(artifact.module, artifact.id)
+            for package in artifact.exports:
+                self._packages.setdefault(package, artifact.id)
+
+    def dependencies(self, artifact):
+        """Returns the ids of the artifacts referenced by an artifact. Unresolved references are kept as is (file, module or package names)."""
+        dependencies = set(artifact.class_path)
+        dependencies.update(self._modules.get(it, it) for it in artifact.requires)
+        dependencies.update(self._packages.get(it, it) for it in artifact.imports)
+        dependencies.discard(artifact.id)
+        return dependencies
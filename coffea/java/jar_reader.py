@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+from collections import namedtuple
+
+log = logging.getLogger('jar')
+
+# Compression methods
+STORED = 0
+DEFLATED = 8
+
+# Record signatures
+_LOCAL_HEADER_SIG = 0x04034b50
+_CENTRAL_HEADER_SIG = 0x02014b50
+_END_OF_CENTRAL_DIR_SIG = 0x06054b50
+_ZIP64_END_OF_CENTRAL_DIR_SIG = 0x06064b50
+_ZIP64_LOCATOR_SIG = 0x07064b50
+_ZIP64_EXTRA_ID = 0x0001
+
+# Record structures (little-endian)
+_END_OF_CENTRAL_DIR = struct.Struct('<IHHHHIIH')
+_ZIP64_LOCATOR = struct.Struct('<IIQI')
+_ZIP64_END_OF_CENTRAL_DIR = struct.Struct('<IQHHIIQQQQ')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_EXTRA_HEADER = struct.Struct('<HH')
+_U8 = struct.Struct('<Q')
+
+# End of central directory record + maximum comment length
+_MAX_EOCD_SEARCH = _END_OF_CENTRAL_DIR.size + 0xffff
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+# JMOD files: a header (magic + version) followed by a zip with classes/, lib/, bin/... sections
+_JMOD_MAGIC = 'JM'
+_JMOD_HEADER_SIZE = 4
+_JMOD_CLASSES = 'classes/'
+
+MANIFEST_NAME = 'META-INF/MANIFEST.MF'
+
+# Central directory entry
+JarEntry = namedtuple('JarEntry', 'name method flags crc compressed_size file_size header_offset')
+
+def parse_manifest(data):
+    """Returns the main attributes of a jar manifest as a dict (names are case-insensitive, stored lower-case)."""
+    attributes = {}
+    name = None
+    for line in str(data).replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        if not line:
+            # The main section ends with the first empty line
+            break
+        if line.startswith(' ') and name is not None:
+            attributes[name] += line[1:]
+        else:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            attributes[name] = value[1:] if value.startswith(' ') else value
+    return attributes
+
+class JarReader(object):
+    """A minimal zip reader working on top of a memory buffer or a memory-mapped file.
+
+    The central directory is parsed directly. STORED entries are returned as read-only 
+    buffer slices of the underlying data (no copy), DEFLATED ones are decompressed. 
+    Slices are only valid until the reader is closed.
+    """
+
+    def __init__(self, data, name='<buffer>'):
+        """Initializes a new instance of the JarReader class using a buffer-like object (str, buffer, mmap)."""
+        self.name = name
+        self._data = data
+        self._file = None
+        self.entries = self._parse_central_directory(data)
+        self.jmod = self._base_offset == _JMOD_HEADER_SIZE and data[0:2] == _JMOD_MAGIC
+        self._index = None
+        self._manifest = None
+
+    @classmethod
+    def open(cls, path):
+        """Opens and memory-maps an archive file."""
+        f = open(path, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise AssertionError('Invalid archive (empty file): %s' % path)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            f.close()
+            raise
+        try:
+            reader = cls(data, path)
+        except:
+            data.close()
+            f.close()
+            raise
+        reader._file = f
+        return reader
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        """Releases the underlying memory map (if any)."""
+        if self._file is not None:
+            self._data.close()
+            self._file.close()
+            self._file = None
+        self._data = None
+
+    def fingerprint(self):
+        """Returns a content fingerprint based on entry names, CRCs and sizes (central directory only)."""
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update('%s:%08x:%d\n' % (entry.name, entry.crc, entry.file_size))
+        return digest.hexdigest()
+
+    def resource_name(self, entry):
+        """Returns the entry path relative to the class path root (None for jmod entries outside of classes/)."""
+        if self.jmod:
+            return entry.name[len(_JMOD_CLASSES):] if entry.name.startswith(_JMOD_CLASSES) else None
+        return entry.name
+
+    def find(self, name):
+        """Looks up an entry by name. Returns None if not found."""
+        if self._index is None:
+            self._index = dict((entry.name, entry) for entry in self.entries)
+        return self._index.get(name)
+
+    def manifest(self):
+        """Returns the main attributes of the archive manifest (empty if there is none)."""
+        if self._manifest is None:
+            entry = self.find(_JMOD_CLASSES + MANIFEST_NAME if self.jmod else MANIFEST_NAME)
+            self._manifest = parse_manifest(self.read(entry)) if entry is not None else {}
+        return self._manifest
+
+    @property
+    def multi_release(self):
+        """Checks if the archive is a multi-release jar (Multi-Release: true in the manifest)."""
+        return self.manifest().get('multi-release', '').strip().lower() == 'true'
+
+    def _parse_central_directory(self, data):
+        size = len(data)
+        search_start = max(0, size - _MAX_EOCD_SEARCH)
+        eocd_offset = data[search_start:size].rfind('PK\x05\x06')
+        if eocd_offset < 0:
+            raise AssertionError('Invalid archive (no central directory): %s' % self.name)
+        eocd_offset += search_start
+
+        (signature, disk, cd_disk, disk_entries, entries_count, 
+         cd_size, cd_offset, comment_length) = _END_OF_CENTRAL_DIR.unpack_from(data, eocd_offset)
+        cd_end = eocd_offset
+
+        locator_offset = eocd_offset - _ZIP64_LOCATOR.size
+        if locator_offset >= 0 and _ZIP64_LOCATOR.unpack_from(data, locator_offset)[0] == _ZIP64_LOCATOR_SIG:
+            zip64_offset = locator_offset - _ZIP64_END_OF_CENTRAL_DIR.size
+            zip64_record = _ZIP64_END_OF_CENTRAL_DIR.unpack_from(data, zip64_offset)
+            if zip64_record[0] != _ZIP64_END_OF_CENTRAL_DIR_SIG:
+                raise AssertionError('Invalid archive (zip64 end of central directory): %s' % self.name)
+            (entries_count, cd_size, cd_offset) = zip64_record[7:10]
+            cd_end = zip64_offset
+
+        # Data prepended to the archive (e.g. .jmod header, self-extracting stubs) shifts all offsets
+        self._base_offset = base_offset = cd_end - cd_size - cd_offset
+        if base_offset < 0:
+            raise AssertionError('Invalid archive (central directory offset): %s' % self.name)
+
+        entries = []
+        offset = base_offset + cd_offset
+        for entry_index in xrange(entries_count):
+            (signature, version_made, version_needed, flags, method, mod_time, mod_date, crc, 
+             compressed_size, file_size, name_length, extra_length, comment_length, 
+             disk_start, internal_attrs, external_attrs, header_offset) = _CENTRAL_HEADER.unpack_from(data, offset)
+            if signature != _CENTRAL_HEADER_SIG:
+                raise AssertionError('Invalid archive (central directory entry %d): %s' % (entry_index, self.name))
+            offset += _CENTRAL_HEADER.size
+            name = data[offset:offset + name_length]
+            offset += name_length
+            if 0xffffffff in (compressed_size, file_size, header_offset):
+                (file_size, compressed_size, header_offset) = self._zip64_extra(data, offset, extra_length, 
+                                                                                file_size, compressed_size, header_offset)
+            offset += extra_length + comment_length
+            
+            entries.append(JarEntry(name, method, flags, crc, compressed_size, file_size, header_offset))
+        
+        log.debug('Central directory: %s entries=%d', self.name, len(entries))
+        return entries
+
+    def _zip64_extra(self, data, offset, extra_length, file_size, compressed_size, header_offset):
+        """Reads 64-bit sizes/offset from the zip64 extended information extra field."""
+        end = offset + extra_length
+        while offset + _EXTRA_HEADER.size <= end:
+            (extra_id, data_size) = _EXTRA_HEADER.unpack_from(data, offset)
+            offset += _EXTRA_HEADER.size
+            if extra_id == _ZIP64_EXTRA_ID:
+                values = []
+                for value in (file_size, compressed_size, header_offset):
+                    if value == 0xffffffff:
+                        values.append(_U8.unpack_from(data, offset)[0])
+                        offset += _U8.size
+                    else:
+                        values.append(value)
+                return tuple(values)
+            offset += data_size
+        return (file_size, compressed_size, header_offset)
+
+    def _data_offset(self, entry):
+        offset = self.entry_offset(entry)
+        (signature, version, flags, method, mod_time, mod_date, crc, 
+         compressed_size, file_size, name_length, extra_length) = _LOCAL_HEADER.unpack_from(self._data, offset)
+        if signature != _LOCAL_HEADER_SIG:
+            raise AssertionError('Invalid archive (local header): %s!/%s' % (self.name, entry.name))
+        return offset + _LOCAL_HEADER.size + name_length + extra_length
+
+    def entry_offset(self, entry):
+        """Returns the position of an entry (its local header) in the archive file."""
+        return self._base_offset + entry.header_offset
+
+    def raw(self, entry):
+        """Returns (compressed) entry data as a buffer slice."""
+        if entry.flags & 0x1:
+            raise AssertionError('Encrypted entries not supported: %s!/%s' % (self.name, entry.name))
+        return buffer(self._data, self._data_offset(entry), entry.compressed_size)
+
+    def read(self, entry):
+        """Returns entry content: a buffer slice for STORED entries, a string for DEFLATED ones."""
+        raw = self.raw(entry)
+        if entry.method == STORED:
+            return raw
+        elif entry.method == DEFLATED:
+            return zlib.decompress(raw, -zlib.MAX_WBITS, entry.file_size or 1)
+        else:
+            raise AssertionError('Unsupported compression method %d: %s!/%s' % (entry.method, self.name, entry.name))
+
+    def copy(self, entry, target):
+        """Writes entry content to a file object, decompressing in chunks."""
+        raw = self.raw(entry)
+        if entry.method == STORED:
+            target.write(raw)
+        elif entry.method == DEFLATED:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            for chunk_offset in xrange(0, len(raw), _COPY_CHUNK_SIZE):
+                target.write(decompressor.decompress(raw[chunk_offset:chunk_offset + _COPY_CHUNK_SIZE]))
+            target.write(decompressor.flush())
+        else:
+            raise AssertionError('Unsupported compression method %d: %s!/%s' % (entry.method, self.name, entry.name))
@@ -16,16 +16,23 @@
 # limitations under the License.
 #
 
-import itertools
 import logging
-import os
+import re
 import struct
 import sys
 
+from array import array
 from collections import namedtuple
 
+from coffea.symbols import symbols
+
 log = logging.getLogger('java')
 
+# Parse modes (fields, methods and attributes are always decoded on first access)
+PARSE_FULL = 'full'                 # Constant pool tuples plus an offset index of the member tables
+PARSE_CODE_SIZE = 'code_size'       # Offset index of the member tables (incl. code size), no tuples
+PARSE_DEPENDENCIES = 'dependencies' # Stop before the member tables
+
 # Class access flags
 _CLASS_ACC_PUBLIC       = 0x0001
 _CLASS_ACC_FINAL        = 0x0010
@@ -35,6 +42,7 @@ _CLASS_ACC_ABSTRACT     = 0x0400
 _CLASS_ACC_SYNTHETIC    = 0x1000
 _CLASS_ACC_ANNOTATION   = 0x2000
 _CLASS_ACC_ENUM         = 0x4000
+_CLASS_ACC_MODULE       = 0x8000
 
 # Constant pool tags
 _CONSTANT_Class = 7
@@ -50,7 +58,10 @@ _CONSTANT_NameAndType = 12
 _CONSTANT_Utf8 = 1
 _CONSTANT_MethodHandle = 15
 _CONSTANT_MethodType = 16
+_CONSTANT_Dynamic = 17
 _CONSTANT_InvokeDynamic = 18
+_CONSTANT_Module = 19
+_CONSTANT_Package = 20
 
 # Constant pool tuples
 CPClass = namedtuple('CPClass', 'tag name_index')
@@ -66,7 +77,10 @@ CPNameAndType = namedtuple('CPNameAndType', 'tag name_index descriptor_index')
 CPUtf8 = namedtuple('CPUtf8', 'tag utf8_str_len utf8_str')
 CPMethodHandle = namedtuple('CPMethodHandle', 'tag reference_kind reference_index')
 CPMethodType = namedtuple('CPMethodType', 'tag descriptor_index')
+CPDynamic = namedtuple('CPDynamic', 'tag bootstrap_method_attr_index name_and_type_index')
 CPInvokeDynamic = namedtuple('CPInvokeDynamic', 'tag bootstrap_method_attr_index name_and_type_index')
+CPModule = namedtuple('CPModule', 'tag name_index')
+CPPackage = namedtuple('CPPackage', 'tag name_index')
 
 # Fields
 Field = namedtuple('Field', 'name descriptor attrs')
@@ -77,13 +91,84 @@ Code = namedtuple('Code', 'length')
 
 # Attributes
 Attribute = namedtuple('Attribute', 'name value')
+ModuleInfo = namedtuple('ModuleInfo', 'name requires exports')
+
+# Precompiled structures (big-endian, as defined by the class file format)
+_U1 = struct.Struct('>B')
+_U2 = struct.Struct('>H')
+_U2x2 = struct.Struct('>HH')
+_U2x3 = struct.Struct('>HHH')
+_U2x4 = struct.Struct('>HHHH')
+_HEADER = struct.Struct('>IHH')
+_ATTRIBUTE_HEADER = struct.Struct('>HI')
+
+# Fixed-size constant pool entries: tag -> (tuple type, structure)
+_CONSTANT_POOL_ENTRIES = {
+    _CONSTANT_Class:              (CPClass, struct.Struct('>H')),
+    _CONSTANT_FieldRef:           (CPFieldRef, struct.Struct('>HH')),
+    _CONSTANT_MethodRef:          (CPMethodRef, struct.Struct('>HH')),
+    _CONSTANT_InterfaceMethodRef: (CPInterfaceMethodRef, struct.Struct('>HH')),
+    _CONSTANT_String:             (CPString, struct.Struct('>H')),
+    _CONSTANT_Integer:            (CPInteger, struct.Struct('>I')),
+    _CONSTANT_Float:              (CPFloat, struct.Struct('>I')),
+    _CONSTANT_Long:               (CPLong, struct.Struct('>II')),
+    _CONSTANT_Double:             (CPDouble, struct.Struct('>II')),
+    _CONSTANT_NameAndType:        (CPNameAndType, struct.Struct('>HH')),
+    _CONSTANT_MethodHandle:       (CPMethodHandle, struct.Struct('>BH')),
+    _CONSTANT_MethodType:         (CPMethodType, struct.Struct('>H')),
+    _CONSTANT_Dynamic:            (CPDynamic, struct.Struct('>HH')),
+    _CONSTANT_InvokeDynamic:      (CPInvokeDynamic, struct.Struct('>HH')),
+    _CONSTANT_Module:             (CPModule, struct.Struct('>H')),
+    _CONSTANT_Package:            (CPPackage, struct.Struct('>H')),
+}
+
+# Class references in field/method descriptors and generic signatures (JVMS 4.3 and 4.7.9.1).
+# Formal type parameters, type variables and inner class suffixes are consumed, so that scanning
+# never resumes in the middle of an identifier; only group 1 (a class name) is of interest.
+_SIGNATURE_TOKEN = re.compile(r'[^:;<>.()\[/^*+\-]+:|T[^;<>]+;|\.[^;<>.]+|L([^;<>.]+)')
+
+class ClassFormatError(AssertionError):
+    """Raised for malformed or unsupported class files. offset is the position of the problem (if known)."""
+
+    def __init__(self, message, offset=None):
+        AssertionError.__init__(self, message)
+        self.offset = offset
+
+def _read_str(buf, offset, length):
+    """Reads a raw string from any buffer-like object (str, bytearray, buffer, memoryview)."""
+    return struct.unpack_from('%ds' % length, buf, offset)[0]
 
 class JavaClass(object):
-    """A Python representation of a Java class."""
+    """A Python representation of a Java class.
     
-    def __init__(self, filename):
+    Instances keep the class content and constant pool index, so that members can 
+    be decoded on demand. A compact instance (see release()) keeps only the class 
+    declaration and extracted dependencies. On 64-bit CPython 2.7 it takes under 
+    1.1 KB for a class with up to 15 dependencies (2.6 KB up to 63), not counting 
+    the name strings.
+    """
+    __slots__ = ('mode', 'size', 'minor', 'major', 'access_flags', 'name', 'super_name', 'interfaces', 
+                 'constant_pool', '_buf', '_cp_tags', '_cp_offsets', '_members_offset', 
+                 '_field_offsets', '_method_offsets', '_attributes_offset', '_code_size',
+                 '_fields', '_methods', '_attributes', '_dependencies', '_all_dependencies')
+    
+    def __init__(self, filename, mode=PARSE_FULL, compact=False):
         """Creates a new object instance using a .class file as input."""
-        self._parse(filename)
+        log.debug('Processing bytecode: %s', filename)
+        with open(filename, "rb") as f:
+            data = f.read()
+        self._parse(data, filename, mode)
+        if compact:
+            self.release()
+
+    @classmethod
+    def from_bytes(cls, data, name=None, mode=PARSE_FULL, compact=False):
+        """Creates a new object instance using class file content (str, bytearray, buffer or memoryview) as input."""
+        java_class = cls.__new__(cls)
+        java_class._parse(data, name if name is not None else '<bytes>', mode)
+        if compact:
+            java_class.release()
+        return java_class
 
     def __repr__(self):
         """Returns a string representation of this object."""
@@ -105,7 +190,7 @@ class JavaClass(object):
             str += "class "
 
         str += self.name 
-        if self.super_name != 'java/lang/Object':
+        if self.super_name is not None and self.super_name != 'java.lang.Object':
             str += " extends "
             str += self.super_name
 
@@ -114,209 +199,427 @@ class JavaClass(object):
 
         return str
 
-    def _parse(self, filename):
-        """Main parse method."""    
-        log.debug('Processing bytecode: %s', filename)
-        with open(filename, "rb") as f:
-            self.size = os.fstat(f.fileno()).st_size
-
-            self._parse_header(f)
-            self._parse_constant_pool(f)
-            self._parse_class_declaration(f)
-            self._parse_fields(f)
-            self._parse_methods(f)
-            self._parse_attributes(f)
-
-    def _parse_header(self, f):
+    def _parse(self, buf, source, mode):
+        """Main parse method. Decodes the class from a single buffer up to the point required by mode."""    
+        if mode not in (PARSE_FULL, PARSE_CODE_SIZE, PARSE_DEPENDENCIES):
+            raise AssertionError('Invalid parse mode: %s' % mode)
+
+        self.mode = mode
+        self.size = len(buf)
+        self._buf = buf
+        self._fields = self._methods = self._attributes = None
+        self._field_offsets = self._method_offsets = None
+        self._attributes_offset = self._code_size = None
+        self._dependencies = self._all_dependencies = None
+
+        try:
+            offset = self._parse_header(buf, 0, source)
+            offset = self._parse_constant_pool(buf, offset)
+            offset = self._parse_class_declaration(buf, offset)
+            self._members_offset = offset
+            if mode != PARSE_DEPENDENCIES:
+                self._index_members()
+        except struct.error as e:
+            raise ClassFormatError('Truncated class file: {0} ({1})'.format(source, e), len(buf))
+
+    def _parse_header(self, buf, offset, source):
         """Parse header: magic, minor, major."""
-        (magic,) = struct.unpack('>I', f.read(4))
+        (magic, self.minor, self.major) = _HEADER.unpack_from(buf, offset)
         if magic != 0xcafebabe:
-            raise AssertionError('Invalid class header: magic={0} file={1}'.format(hex(magic), f.name))
-        (self.minor, self.major) = struct.unpack('>HH', f.read(4))
+            raise ClassFormatError('Invalid class header: magic={0} file={1}'.format(hex(magic), source), offset)
         log.debug('Header: magic=%s minor=%d major=%d', hex(magic), self.minor, self.major)
+        return offset + _HEADER.size
 
-    def _parse_constant_pool(self, f):
+    def _parse_constant_pool(self, buf, offset):
         """Parse the constant pool."""
-        (constant_pool_count,) = struct.unpack('>H', f.read(2))
+        (constant_pool_count,) = _U2.unpack_from(buf, offset)
+        offset += 2
         log.debug('Constant pool count: %d', constant_pool_count)       
 
-        #All 8-byte constants (long, double) take up two entries in the constant_pool (skip one entry)
-        def _skip_one(iterator):       
-                next(itertools.islice(iterator, 1, 1), None)
-                # Keep the index consistent - add an empty entry to fill in the gap
-                self.constant_pool.append(None)
+        # Tags and entry offsets (just past the tag) are always recorded, so that
+        # single entries can be decoded on demand. Tuples are built in PARSE_FULL mode only.
+        self._cp_tags = cp_tags = bytearray(constant_pool_count)
+        self._cp_offsets = cp_offsets = array('I', [0]) * constant_pool_count
 
         # Constant pool index starts at 1 - assume an empty reference at 0  
-        self.constant_pool = [None]
-        cp_iterator = iter(xrange(1, constant_pool_count))
-        for cp_index in cp_iterator:
-            (tag,) = struct.unpack('>B', f.read(1))
-            if tag == _CONSTANT_Class:
-                cp_item = CPClass(tag, *struct.unpack('>H', f.read(2)))             
-            elif tag == _CONSTANT_FieldRef:
-                cp_item = CPFieldRef(tag, *struct.unpack('>HH', f.read(4)))
-            elif tag == _CONSTANT_MethodRef:
-                cp_item = CPMethodRef(tag, *struct.unpack('>HH', f.read(4)))
-            elif tag == _CONSTANT_InterfaceMethodRef:
-                cp_item = CPInterfaceMethodRef(tag, *struct.unpack('>HH', f.read(4)))
-            elif tag == _CONSTANT_String:
-                cp_item = CPString(tag, *struct.unpack('>H', f.read(2)))
-            elif tag == _CONSTANT_Integer:
-                cp_item = CPInteger(tag, *struct.unpack('>I', f.read(4)))
-            elif tag == _CONSTANT_Float:
-                cp_item = CPFloat(tag, *struct.unpack('>I', f.read(4)))
-            elif tag == _CONSTANT_Long:
-                cp_item = CPLong(tag, *struct.unpack('>II', f.read(8)))
-                _skip_one(cp_iterator)
-            elif tag == _CONSTANT_Double:
-                cp_item = CPDouble(tag, *struct.unpack('>II', f.read(8)))
-                _skip_one(cp_iterator)
-            elif tag == _CONSTANT_NameAndType:
-                cp_item = CPNameAndType(tag, *struct.unpack('>HH', f.read(4)))
-            elif tag == _CONSTANT_Utf8:
-                (utf8_str_len,) = struct.unpack('>H', f.read(2))
-                cp_item = CPUtf8(tag, utf8_str_len, *struct.unpack(str(utf8_str_len)+'s', f.read(utf8_str_len)))    
-            elif tag == _CONSTANT_MethodHandle:
-                cp_item = CPMethodHandle(tag, *struct.unpack('>BH', f.read(3)))
-            elif tag == _CONSTANT_MethodType:
-                cp_item = CPMethodType(tag, *struct.unpack('>H', f.read(2)))
-            elif tag == _CONSTANT_InvokeDynamic:
-                cp_item = CPInvokeDynamic(tag, *struct.unpack('>HH', f.read(4)))
+        self.constant_pool = constant_pool = [None] if self.mode == PARSE_FULL else None
+        cp_index = 1
+        while cp_index < constant_pool_count:
+            (tag,) = _U1.unpack_from(buf, offset)
+            offset += 1
+            cp_tags[cp_index] = tag
+            cp_offsets[cp_index] = offset
+            if tag == _CONSTANT_Utf8:
+                (utf8_str_len,) = _U2.unpack_from(buf, offset)
+                if constant_pool is not None:
+                    constant_pool.append(CPUtf8(tag, utf8_str_len, _read_str(buf, offset + 2, utf8_str_len)))
+                offset += 2 + utf8_str_len
             else:
-                log.error('Unknown tag: %d', tag)
-                raise AssertionError('Unknown tag: {0}'.format(tag))
+                entry = _CONSTANT_POOL_ENTRIES.get(tag)
+                if entry is None:
+                    log.error('Unknown tag: %d', tag)
+                    raise ClassFormatError('Unknown tag: {0}'.format(tag), offset - 1)
+                (cp_type, cp_struct) = entry
+                if constant_pool is not None:
+                    constant_pool.append(cp_type(tag, *cp_struct.unpack_from(buf, offset)))
+                offset += cp_struct.size
             
-            self.constant_pool.append(cp_item)
+            cp_index += 1
+
+            #All 8-byte constants (long, double) take up two entries in the constant_pool (skip one entry)
+            if tag == _CONSTANT_Long or tag == _CONSTANT_Double:
+                # Keep the index consistent - add an empty entry to fill in the gap
+                if constant_pool is not None:
+                    constant_pool.append(None)
+                cp_index += 1
+
+        return offset
 
-    def _parse_class_declaration(self, f):
+    def _parse_class_declaration(self, buf, offset):
         """Parse class declaration: access flags, this/super class, implemented interfaces."""
-        (access_flags, this_class, super_class, interface_count) = struct.unpack('>HHHH', f.read(8))
+        (access_flags, this_class, super_class, interface_count) = _U2x4.unpack_from(buf, offset)
+        offset += _U2x4.size
         
-        self.public = access_flags & _CLASS_ACC_PUBLIC
-        self.final = access_flags & _CLASS_ACC_FINAL
-        self.interface = access_flags & _CLASS_ACC_INTERFACE
-        self.abstract = access_flags & _CLASS_ACC_ABSTRACT
-        self.annotation = access_flags & _CLASS_ACC_ANNOTATION
-        self.enum = access_flags & _CLASS_ACC_ENUM 
+        self.access_flags = access_flags
 
         self.name = self._constant_pool_class(this_class)
-        self.super_name = self._constant_pool_class(super_class)
+        # java.lang.Object (and module-info) has no super class
+        self.super_name = self._constant_pool_class(super_class) if super_class != 0 else None
         self.interfaces = []
         for interface_index in xrange(interface_count):
-            (interface_cp_index, ) = struct.unpack('>H', f.read(2))
+            (interface_cp_index, ) = _U2.unpack_from(buf, offset)
+            offset += 2
             interface_class = self._constant_pool_class(interface_cp_index) 
             self.interfaces.append(interface_class)
-
-    def _parse_fields(self, f):
-        """Parse class fields."""
-        (fields_count,) = struct.unpack('>H', f.read(2))
-        self.fields = []
-        for field_index in xrange(fields_count):
-            (access_flags, name_index, descriptor_index, attributes_count) = struct.unpack('>HHHH', f.read(8))
-            
-            field = Field(self._constant_pool_name(name_index), self._constant_pool_name(descriptor_index), [])
+        return offset
+
+    def _index_members(self):
+        """Indexes field and method tables by byte offset and locates the class attribute table."""
+        buf = self._buf
+        (self._field_offsets, offset, _) = self._index_member_table(buf, self._members_offset)
+        (self._method_offsets, offset, self._code_size) = self._index_member_table(buf, offset)
+        self._attributes_offset = offset
+        log.debug('Member index: fields=%d methods=%d code_size=%d', 
+                  len(self._field_offsets), len(self._method_offsets), self._code_size)
+
+    def _index_member_table(self, buf, offset):
+        """Walks a field or method table by attribute headers only. 
+
+        Returns an (offsets, next_offset, code_length) tuple, where code_length is the summed length of all Code attributes."""
+        (members_count,) = _U2.unpack_from(buf, offset)
+        offset += 2
+        member_offsets = array('I')
+        code_length = 0
+        code_names = {}
+        for member_index in xrange(members_count):
+            member_offsets.append(offset)
+            (access_flags, name_index, descriptor_index, attributes_count) = _U2x4.unpack_from(buf, offset)
+            offset += _U2x4.size
             for attribute_index in xrange(attributes_count):
-                field.attrs.append(self._parse_attribute_info(f))
-            
-            self.fields.append(field)
-            log.debug('Field: %s %s %s', field.name, field.descriptor, field.attrs)
-
-    def _parse_methods(self, f):
-        """Parse class methods."""
-        (methods_count,) = struct.unpack('>H', f.read(2))
-        self.methods = []
-        for method_index in xrange(methods_count):
-            (access_flags, name_index, descriptor_index, attributes_count) = struct.unpack('>HHHH', f.read(8))
-            
-            method = Method(self._constant_pool_name(name_index), self._constant_pool_name(descriptor_index), [])
+                (attribute_name_index, attribute_length) = _ATTRIBUTE_HEADER.unpack_from(buf, offset)
+                is_code = code_names.get(attribute_name_index)
+                if is_code is None:
+                    is_code = code_names[attribute_name_index] = self._constant_pool_name(attribute_name_index) == 'Code'
+                if is_code:
+                    code_length += attribute_length
+                offset += _ATTRIBUTE_HEADER.size + attribute_length
+        return (member_offsets, offset, code_length)
+
+    def _ensure_content(self):
+        """Fails if class content was released."""
+        if self._buf is None:
+            raise AssertionError('Class content was released: %s' % self.name)
+
+    def _ensure_index(self):
+        """Indexes member tables, if it wasn't done while parsing."""
+        if self._attributes_offset is None:
+            self._ensure_content()
+            self._index_members()
+
+    def _signature_indices(self):
+        """Returns constant pool indices of member descriptors and all Signature attributes."""
+        self._ensure_index()
+        buf = self._buf
+        indices = []
+        signature_names = {}
+        
+        def _attribute_table(offset, attributes_count):
             for attribute_index in xrange(attributes_count):
-                method.attrs.append(self._parse_attribute_info(f))
+                (attribute_name_index, attribute_length) = _ATTRIBUTE_HEADER.unpack_from(buf, offset)
+                offset += _ATTRIBUTE_HEADER.size
+                is_signature = signature_names.get(attribute_name_index)
+                if is_signature is None:
+                    is_signature = signature_names[attribute_name_index] = self._constant_pool_name(attribute_name_index) == 'Signature'
+                if is_signature:
+                    indices.append(_U2.unpack_from(buf, offset)[0])
+                offset += attribute_length
+
+        for member_offsets in (self._field_offsets, self._method_offsets):
+            for offset in member_offsets:
+                (access_flags, name_index, descriptor_index, attributes_count) = _U2x4.unpack_from(buf, offset)
+                indices.append(descriptor_index)
+                _attribute_table(offset + _U2x4.size, attributes_count)
+        
+        offset = self._attributes_offset
+        _attribute_table(offset + 2, _U2.unpack_from(buf, offset)[0])
+        return indices
+
+    def _extract_dependencies(self, descriptors):
+        """Collects referenced classes in a single constant pool pass."""
+        self._ensure_content()
+        buf = self._buf
+        cp_tags = self._cp_tags
+        cp_offsets = self._cp_offsets
+
+        class_name_indices = set()
+        signature_indices = set()
+        for cp_index in xrange(1, len(cp_tags)):
+            tag = cp_tags[cp_index]
+            if tag == _CONSTANT_Class:
+                class_name_indices.add(_U2.unpack_from(buf, cp_offsets[cp_index])[0])
+            elif descriptors and tag == _CONSTANT_NameAndType:
+                signature_indices.add(_U2.unpack_from(buf, cp_offsets[cp_index] + 2)[0])
+            elif descriptors and tag == _CONSTANT_MethodType:
+                signature_indices.add(_U2.unpack_from(buf, cp_offsets[cp_index])[0])
+
+        dependencies = set()
+        for name_index in class_name_indices:
+            class_name = self._constant_pool_name(name_index)
+            if class_name[0] == '[':
+                # Array class: [[Ljava/lang/String; or [I (no dependency)
+                class_name = class_name.lstrip('[')
+                if class_name[0] != 'L':
+                    continue
+                class_name = class_name[1:-1]
+            dependencies.add(symbols.class_name(class_name))
+
+        if descriptors:
+            signature_indices.update(self._signature_indices())
+            signatures = ';'.join(self._constant_pool_name(it) for it in signature_indices)
+            for token in _SIGNATURE_TOKEN.finditer(signatures):
+                class_name = token.group(1)
+                if class_name is not None:
+                    dependencies.add(symbols.class_name(class_name))
+
+        return frozenset(dependencies)
+
+    def _decode_member(self, member_type, offset):
+        """Decodes a single field or method."""
+        buf = self._buf
+        (access_flags, name_index, descriptor_index, attributes_count) = _U2x4.unpack_from(buf, offset)
+        offset += _U2x4.size
             
-            self.methods.append(method)
-            log.debug('Method: %s %s %s', method.name, method.descriptor, method.attrs)
-
-
-    def _parse_attributes(self, f):
-        """Parse class attributes."""
-        (attributes_count,) = struct.unpack('>H', f.read(2))
-        self.attributes = []
+        member = member_type(self._constant_pool_name(name_index), self._constant_pool_name(descriptor_index), [])
         for attribute_index in xrange(attributes_count):
-            self.attributes.append(self._parse_attribute_info(f))
+            (attribute, offset) = self._parse_attribute_info(buf, offset)
+            member.attrs.append(attribute)
+            
+        log.debug('%s: %s %s %s', member_type.__name__, member.name, member.descriptor, member.attrs)
+        return member
+
+    def _decode_attributes(self):
+        """Decodes class attributes."""
+        buf = self._buf
+        offset = self._attributes_offset
+        (attributes_count,) = _U2.unpack_from(buf, offset)
+        offset += 2
+        attributes = []
+        for attribute_index in xrange(attributes_count):
+            (attribute, offset) = self._parse_attribute_info(buf, offset)
+            attributes.append(attribute)
         
         if log.isEnabledFor(logging.DEBUG):
-            log.debug('Attributes: %s', map(lambda it: it.name+':'+str(it.value), self.attributes))
-
+            log.debug('Attributes: %s', map(lambda it: it.name+':'+str(it.value), attributes))
+        return attributes
 
-    def _parse_attribute_info(self, f):
-        """Parse attribute info. """
-        (attribute_name_index, attribute_length) = struct.unpack('>HI', f.read(6))
+    def _parse_attribute_info(self, buf, offset):
+        """Parse attribute info. Returns an (attribute, next_offset) tuple."""
+        (attribute_name_index, attribute_length) = _ATTRIBUTE_HEADER.unpack_from(buf, offset)
+        offset += _ATTRIBUTE_HEADER.size
+        next_offset = offset + attribute_length
 
         attr_name = self._constant_pool_name(attribute_name_index)
         if attr_name == 'SourceFile':
-            attr_value = self._constant_pool_name(*struct.unpack('>H', f.read(2)))
+            attr_value = self._constant_pool_name(*_U2.unpack_from(buf, offset))
         elif attr_name == 'Deprecated':
             attr_value = True
         elif attr_name == 'Code':
-            f.read(attribute_length) 
             attr_value = Code(attribute_length)
         elif attr_name == 'Signature':
-            attr_value = self._constant_pool_name(*struct.unpack('>H', f.read(2)))
+            attr_value = self._constant_pool_name(*_U2.unpack_from(buf, offset))
         elif attr_name == 'Exceptions':
             attr_value = []
-            for exception_index in xrange(*struct.unpack('>H', f.read(2))):
-                exception_class = self._constant_pool_class(*struct.unpack('>H', f.read(2)))
+            (exception_count,) = _U2.unpack_from(buf, offset)
+            for exception_index in xrange(exception_count):
+                offset += 2
+                exception_class = self._constant_pool_class(*_U2.unpack_from(buf, offset))
                 attr_value.append(exception_class)
+        elif attr_name == 'Module':
+            attr_value = self._decode_module(buf, offset)
         else:
             # Skip unsupported content
             # TODO: Debug, since most aren't supported at this point
             log.debug('(!) Unknown attribute: %s', attr_name)             
-            f.read(attribute_length)
             attr_value = None
 
-        return Attribute(attr_name, attr_value)
+        return (Attribute(attr_name, attr_value), next_offset)
+
+    def _decode_module(self, buf, offset):
+        """Decodes the Module attribute: module name, required modules and exported packages (opens, uses and provides are skipped)."""
+        (module_name_index, module_flags, module_version_index, requires_count) = _U2x4.unpack_from(buf, offset)
+        offset += _U2x4.size
+        requires = []
+        for requires_index in xrange(requires_count):
+            requires.append(self._constant_pool_class_name(*_U2.unpack_from(buf, offset)))
+            offset += 6
+        (exports_count,) = _U2.unpack_from(buf, offset)
+        offset += 2
+        exports = []
+        for exports_index in xrange(exports_count):
+            (package_index, exports_flags, exports_to_count) = _U2x3.unpack_from(buf, offset)
+            exports.append(symbols.class_name(self._constant_pool_class_name(package_index)))
+            offset += 6 + 2 * exports_to_count
+        return ModuleInfo(self._constant_pool_class_name(module_name_index), requires, exports)
 
     def _constant_pool_class(self, class_index):
         """Gets a class name from the constant pool."""
-        return self._constant_pool_name(self.constant_pool[class_index].name_index).replace('/', '.')
+        return symbols.class_name(self._constant_pool_class_name(class_index))
+
+    def _constant_pool_class_name(self, class_index):
+        """Gets a raw (internal form) class name from the constant pool."""
+        if self.constant_pool is not None:
+            return self._constant_pool_name(self.constant_pool[class_index].name_index)
+        (name_index,) = _U2.unpack_from(self._buf, self._cp_offsets[class_index])
+        return self._constant_pool_name(name_index)
 
     def _constant_pool_name(self, name_index):
         """Gets a name from the constant pool."""
-        return self.constant_pool[name_index].utf8_str
+        if self.constant_pool is not None:
+            return self.constant_pool[name_index].utf8_str
+        offset = self._cp_offsets[name_index]
+        (utf8_str_len,) = _U2.unpack_from(self._buf, offset)
+        return _read_str(self._buf, offset + 2, utf8_str_len)
+
+    def release(self):
+        """Drops the class content and constant pool, keeping the declaration and data extracted so far.
+
+        Class dependencies (without descriptor references) and, unless parsed in PARSE_DEPENDENCIES 
+        mode, the code size are extracted first. Anything else that wasn't accessed before 
+        becomes unavailable."""
+        if self._buf is None:
+            return
+        self.class_dependencies(sort=False)
+        self._buf = self.constant_pool = self._cp_tags = self._cp_offsets = None
+        self._field_offsets = self._method_offsets = None
+
+    @property
+    def public(self):
+        return self.access_flags & _CLASS_ACC_PUBLIC
+
+    @property
+    def final(self):
+        return self.access_flags & _CLASS_ACC_FINAL
+
+    @property
+    def interface(self):
+        return self.access_flags & _CLASS_ACC_INTERFACE
+
+    @property
+    def abstract(self):
+        return self.access_flags & _CLASS_ACC_ABSTRACT
+
+    @property
+    def annotation(self):
+        return self.access_flags & _CLASS_ACC_ANNOTATION
+
+    @property
+    def enum(self):
+        return self.access_flags & _CLASS_ACC_ENUM
+
+    @property
+    def fields(self):
+        """Returns class fields (decoded on first access)."""
+        if self._fields is None:
+            self._ensure_index()
+            self._ensure_content()
+            self._fields = [self._decode_member(Field, offset) for offset in self._field_offsets]
+        return self._fields
+
+    @property
+    def methods(self):
+        """Returns class methods (decoded on first access)."""
+        if self._methods is None:
+            self._ensure_index()
+            self._ensure_content()
+            self._methods = [self._decode_member(Method, offset) for offset in self._method_offsets]
+        return self._methods
+
+    @property
+    def attributes(self):
+        """Returns class attributes (decoded on first access)."""
+        if self._attributes is None:
+            self._ensure_index()
+            self._ensure_content()
+            self._attributes = self._decode_attributes()
+        return self._attributes
+
+    @property
+    def module(self):
+        """Returns the module descriptor (ModuleInfo) of a module-info class, None for other classes."""
+        if not self.access_flags & _CLASS_ACC_MODULE:
+            return None
+        return next((it.value for it in self.attributes if it.name == 'Module'), None)
 
     @property
     def package(self):
         """Returns the package name."""
-        return '.'.join(self.name.split('.')[:-1])
+        return symbols.package(self.name)
 
     @property
     def code_size(self):
         """Returns the code size in bytes."""
-        code_size = 0
-        for m in self.methods:
-            code_size += next((atr.value.length for atr in m.attrs if atr.name == 'Code'), 0)
-        return code_size
-
-    def class_dependencies(self, sort=True):
-        """Returns a set of class dependencies."""
-        class_defs = []
-        for cd in filter(lambda it: it and it.tag == _CONSTANT_Class, self.constant_pool):
-            class_name = self._constant_pool_name(cd.name_index)
-            if class_name[0] == '[':
-                array_dim = class_name.count('[')
-                if array_dim > 0:
-                    class_name = class_name[array_dim+1:]
-            
-            if len(class_name) > 0 and class_name[-1] == ';':
-                class_name = class_name[:-1]
-            
-            class_name = class_name.replace('/', '.')    
-            if class_name not in class_defs:
-                class_defs.append(class_name)
-            
-        return sorted(class_defs) if sort else class_defs
+        self._ensure_index()
+        return self._code_size
+
+    def class_dependencies(self, sort=True, descriptors=False):
+        """Returns a set of class dependencies. 
+
+        Classes referenced only through field/method descriptors and generic 
+        signatures are included if descriptors is set. The result is cached."""
+        if descriptors:
+            dependencies = self._all_dependencies
+            if dependencies is None:
+                dependencies = self._all_dependencies = self._extract_dependencies(True)
+        else:
+            dependencies = self._dependencies
+            if dependencies is None:
+                dependencies = self._dependencies = self._extract_dependencies(False)
+        return sorted(dependencies) if sort else dependencies
     
-    def package_dependencies(self, sort=True):
+    def member_dependencies(self, sort=True):
+        """Returns a set of referenced fields (Owner#name) and methods (Owner#name(descriptor)).
+
+        Based on CONSTANT_FieldRef, CONSTANT_MethodRef and CONSTANT_InterfaceMethodRef entries."""
+        self._ensure_content()
+        buf = self._buf
+        cp_tags = self._cp_tags
+        cp_offsets = self._cp_offsets
+        
+        members = set()
+        for cp_index in xrange(1, len(cp_tags)):
+            tag = cp_tags[cp_index]
+            if tag != _CONSTANT_FieldRef and tag != _CONSTANT_MethodRef and tag != _CONSTANT_InterfaceMethodRef:
+                continue
+            (class_index, name_and_type_index) = _U2x2.unpack_from(buf, cp_offsets[cp_index])
+            (name_index, descriptor_index) = _U2x2.unpack_from(buf, cp_offsets[name_and_type_index])
+            member = self._constant_pool_class(class_index) + '#' + self._constant_pool_name(name_index)
+            if tag != _CONSTANT_FieldRef:
+                member += self._constant_pool_name(descriptor_index)
+            members.add(symbols.intern(member))
+
+        return sorted(members) if sort else members
+
+    def package_dependencies(self, sort=True, descriptors=False):
         """Returns a set of package dependencies."""
-        pkg_defs = set(map(lambda it: '.'.join(it.split('.')[:-1]), self.class_dependencies(sort=False)))
+        pkg_defs = frozenset(symbols.package(it) for it in self.class_dependencies(sort=False, descriptors=descriptors))
         return sorted(pkg_defs) if sort else pkg_defs
-        
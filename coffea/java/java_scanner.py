@@ -16,26 +16,298 @@
 # limitations under the License.
 #
 
+import fnmatch
+import heapq
+import itertools
 import logging
 import os
+import Queue
 import re
 import shutil
+import stat
 import sys
+import tarfile
 import tempfile
 import zipfile
+import zlib
 
-_PATTERN_ALL_SUPPORTED = ".*\.(class|jar|war|ear)$"
-_PATTERN_ARCHIVE       = ".*\.(jar|war|ear)$"
+from collections import namedtuple
+from contextlib import closing
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+from jar_reader import JarReader, DEFLATED
+from jimage_reader import JImageReader, JIMAGE_NAME
+
+_CLASS_SUFFIX       = '.class'
+_BUNDLE_SUFFIX      = '.zip'
+_ARCHIVE_SUFFIXES   = ('.jar', '.war', '.ear', '.jmod', _BUNDLE_SUFFIX)
+_TAR_SUFFIXES       = ('.tar', '.tar.gz', '.tgz')
+_MODULE_SUFFIXES    = ('.war', '.ear')
+_SUPPORTED_SUFFIXES = (_CLASS_SUFFIX,) + _ARCHIVE_SUFFIXES + _TAR_SUFFIXES
+
+# Archive directories holding classes outside of the package structure
+_CLASS_ROOTS = ('WEB-INF/classes/', 'BOOT-INF/classes/')
+_PATTERN_VERSIONED_ROOT = re.compile(r'META-INF/versions/(\d+)/')
+
+# Archive stack actions
+_SCAN, _OPEN, _CLOSE = range(3)
+
+# Nested archives larger than this are spilled to a temporary file instead of being read into memory
+DEFAULT_SPILL_THRESHOLD = 64 * 1024 * 1024
+
+# Number of class entries inflated per batch in parallel mode (bounds the number of pending results)
+_PARALLEL_BATCH_SIZE = 1024
+
+# Scheduled scans: maximum estimated cost of a chunk of class entries and the fixed cost of an 
+# entry (in bytes of uncompressed class data)
+_CHUNK_COST = 8 * 1024 * 1024
+_ENTRY_COST = 256
+
+# Initial size of the buffer loose class files are read into (grown on demand)
+_READ_BUFFER_SIZE = 64 * 1024
  
 log = logging.getLogger('scanner')
 
+def _fingerprint(entry):
+    """Returns a content fingerprint of an archive entry (None if the archive keeps no checksums)."""
+    if entry.crc is None:
+        return None
+    return (entry.name, entry.crc, entry.file_size)
+
+def _is_jimage(path):
+    """Checks if a file is a JDK runtime image ($JAVA_HOME/lib/modules)."""
+    return os.path.basename(path) == JIMAGE_NAME and JImageReader.is_jimage(path)
+
+def _open_archive(path):
+    """Opens an archive file: a JDK runtime image or a zip (jar, war, ear, jmod)."""
+    if _is_jimage(path):
+        return JImageReader.open(path)
+    return JarReader.open(path)
+
+def entry_class_name(name, plain_root=True):
+    """Derives the class name from the path of a class entry (com/example/A.class -> com.example.A).
+
+    Knows the WEB-INF/classes, BOOT-INF/classes and META-INF/versions/N roots. Returns None 
+    for entries outside of the package structure, or outside of these roots if the archive 
+    root is not a class path root (plain_root=False, e.g. for war and ear modules)."""
+    root = _PATTERN_VERSIONED_ROOT.match(name)
+    if root is not None:
+        name = name[root.end():]
+    elif name.startswith(_CLASS_ROOTS):
+        name = name[name.index('/classes/') + 9:]
+    elif not plain_root or name.startswith(('META-INF/', '/')):
+        return None
+    return name[:-len(_CLASS_SUFFIX)].replace('/', '.')
+
+class ClassRecord(namedtuple('ClassRecord', 'origin name size data fingerprint')):
+    """A class file found by JavaScanner.
+
+    origin is the full path (outer.ear!/lib/x.jar!/a/B.class for archive entries) and name the 
+    path within the innermost archive (or relative to the scanned directory). Archive entries 
+    carry their uncompressed size, content and content fingerprint. Loose files carry no 
+    fingerprint; their size and content are None unless the scanner reads files (read_files), 
+    otherwise the file is read on demand."""
+    __slots__ = ()
+
+    def read(self):
+        """Returns the class file content (a copy, valid after the scanner moved on)."""
+        if self.data is None:
+            with open(self.origin, 'rb') as class_file:
+                return class_file.read()
+        return str(self.data)
+
+class _ArchiveSource(object):
+    """An archive shared by scheduled tasks.
+
+    Closed (and its spill file removed) when the last user releases it. Archive files 
+    (path set) may also be closed in between and are reopened on demand. In-memory nested 
+    archives may be slices of their parent, which is kept open as long as they are."""
+    __slots__ = ('path', 'reader', 'spill_path', 'parent', 'users')
+
+    def __init__(self, path=None, reader=None, spill_path=None, parent=None):
+        self.path = path
+        self.reader = reader
+        self.spill_path = spill_path
+        self.parent = parent
+        self.users = 1
+        if parent is not None:
+            parent.users += 1
+
+    def open(self):
+        if self.reader is None:
+            self.reader = _open_archive(self.path)
+        return self.reader
+
+    def release(self):
+        self.users -= 1
+        if self.users == 0:
+            self.close()
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if self.spill_path is not None:
+            os.remove(self.spill_path)
+            self.spill_path = None
+        if self.parent is not None:
+            self.parent.release()
+            self.parent = None
+
+class _DirEntry(object):
+    """A minimal stand-in for os.DirEntry, used if scandir is not available."""
+    __slots__ = ('name', 'path', '_mode')
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self._mode = None
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self._stat_mode(follow_symlinks))
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self._stat_mode(follow_symlinks))
+
+    def _stat_mode(self, follow_symlinks):
+        if self._mode is None:
+            self._mode = os.lstat(self.path).st_mode
+        if follow_symlinks and stat.S_ISLNK(self._mode):
+            try:
+                return os.stat(self.path).st_mode
+            except OSError:
+                # Broken link
+                return 0
+        return self._mode
+
+def _listdir_scandir(path):
+    # Not a generator - errors are raised on call, like os.scandir does
+    return [_DirEntry(path, name) for name in os.listdir(path)]
+
+if scandir is None:
+    scandir = _listdir_scandir
+
+class _ReadBuffer(object):
+    """A reusable buffer loose class files are read into.
+
+    Files are read unbuffered with readinto, so no string is allocated per file and a file 
+    smaller than the buffer takes a single read call (no fstat). The buffer grows to the 
+    largest file seen; a returned slice is only valid until the next read."""
+
+    def __init__(self, size=_READ_BUFFER_SIZE):
+        self._data = bytearray(size)
+
+    def read(self, path):
+        """Reads the file content and returns it as a buffer slice."""
+        with open(path, 'rb', 0) as f:
+            length = f.readinto(self._data)
+            while length == len(self._data):
+                # A new array - buffer slices do not pin the old one, resizing it in place is unsafe
+                data = bytearray(2 * length)
+                data[:length] = self._data
+                self._data = data
+                length += f.readinto(memoryview(data)[length:])
+        return buffer(self._data, 0, length)
+
+class PathFilter(object):
+    """Include/exclude rules for file system paths and archive entry paths.
+
+    Rules are shell-style globs (fnmatch, '*' also matches '/') matched against the full 
+    path or origin, e.g. '*-sources.jar', '*/test-classes/*' or '*.war!/WEB-INF/lib/guava-*'. 
+    Excluded directories are not traversed and excluded archives are not opened. Include 
+    rules select class files and class entries only, since the content of a directory or 
+    an archive is not known up front."""
+
+    def __init__(self, include=[], exclude=[]):
+        """Initializes a new instance of the PathFilter class."""
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self._include = self._compile(self.include)
+        self._exclude = self._compile(self.exclude)
+
+    def __repr__(self):
+        return 'PathFilter: include=%s exclude=%s' % (self.include, self.exclude)
+
+    def _compile(self, patterns):
+        if not patterns:
+            return None
+        return re.compile('|'.join('(?:%s)' % fnmatch.translate(it) for it in patterns))
+
+    def accept_dir(self, path):
+        """Checks if a directory should be traversed ('*/test' and '*/test/*' both exclude test directories)."""
+        if self._exclude is None:
+            return True
+        return self._exclude.match(path) is None and self._exclude.match(path + '/') is None
+
+    def accept_archive(self, origin):
+        """Checks if an archive (possibly nested in another one) should be opened."""
+        return self._exclude is None or self._exclude.match(origin) is None
+
+    def accept_class(self, origin):
+        """Checks if a class file or a class entry should be reported."""
+        if self._exclude is not None and self._exclude.match(origin) is not None:
+            return False
+        return self._include is None or self._include.match(origin) is not None
+
 class JavaScanner(object):
-    """A simple Java artifact provider."""
+    """A simple Java artifact provider.
+
+    Classes are reported by scan() as callback(path), where path is a class file (archives are 
+    extracted to a temporary directory first, see extract). If data_callback is set instead, 
+    archives are read in memory and every class is reported as data_callback(path, data, 
+    fingerprint), where path is the entry origin (outer.ear!/inner.war!/entry), data holds the 
+    class file content (a string or a buffer slice of a memory-mapped archive, valid during the 
+    call only; None for class files on disk unless read_files is set) and fingerprint identifies 
+    the content by entry name, CRC-32 and size (taken from the central directory, so identical 
+    classes bundled in several archives can be recognized for free). iter_classes() provides 
+    the same records without a callback.
+
+    Archives are jar, war, ear and jmod files and the JDK runtime image (lib/modules), whose 
+    entries are named module/path (modules!/java.base/java/lang/Object.class) and carry no 
+    fingerprint.
+
+    Distribution bundles are zip files (read like jars) and tar files, plain or compressed, 
+    which are streamed in a single forward pass (archives found inside are opened in memory) 
+    unless archives are extracted.
+
+    Multi-release jars (Multi-Release: true in the manifest) contribute one copy of every 
+    class: the base entry or the META-INF/versions/N one with the highest N not above the 
+    target release. Without a target release only base entries are read.
+    """
+
+    def __init__(self, callback=None, extract=None, spill_threshold=DEFAULT_SPILL_THRESHOLD, workers=0, ordered=True, path_filter=None, class_filter=None, release=None, quarantine=None, read_files=False, data_callback=None):
+        """Initializes a new instance of the JavaScanner class.
 
-    def __init__(self, callback):
-        """Initializes a new instance of the JavaScanner class."""
-        self._work_dir = tempfile.mkdtemp()
+        Archives are extracted to a temporary directory if extract is set (by default only if 
+        classes are reported through callback), otherwise they are read in memory."""
+        self._work_dir = None
+        self._pool = None
+        self._archives = {}
+        self.duplicates = []
         self.callback = callback
+        self.data_callback = data_callback
+        self.extract = extract if extract is not None else (callback is not None and data_callback is None)
+        self.spill_threshold = spill_threshold
+        self.workers = workers
+        self.ordered = ordered
+        self.path_filter = path_filter if path_filter is not None else PathFilter()
+        self.class_filter = class_filter
+        self.release = release
+        self.quarantine = quarantine
+        self._read_buffer = _ReadBuffer() if read_files else None
+        self.pruned = 0
+        self.rejected = 0
+        self.superseded = 0
+        if self.extract:
+            self._work_dir = tempfile.mkdtemp()
          
     def __enter__(self):
         return self
@@ -43,9 +315,30 @@ class JavaScanner(object):
     def __exit__(self, type, value, traceback):
         self.dispose()
 
+    @property
+    def work_dir(self):
+        """Returns the temporary directory (created on first use, up front in extract mode)."""
+        if self._work_dir is None:
+            self._work_dir = tempfile.mkdtemp()
+            log.debug('Work directory: %s', self._work_dir)
+        return self._work_dir
+
+    @property
+    def pool(self):
+        """Returns the inflater thread pool (created on first use)."""
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+            log.debug('Inflater pool: workers=%d', self.workers)
+        return self._pool
+
     def dispose(self):
-        """Removes accumulated temporary files."""
-        shutil.rmtree(self._work_dir)
+        """Stops worker threads and removes accumulated temporary files."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._work_dir is not None and os.path.isdir(self._work_dir):
+            shutil.rmtree(self._work_dir)
         
     def supported_file(self, path):
         """Checks if specified file can be consumed by this scanner."""
@@ -53,59 +346,597 @@ class JavaScanner(object):
         if not os.path.isfile(path):
             raise AssertionError('Regular file expected: %s' % path)
     
-        if not re.match(_PATTERN_ALL_SUPPORTED, path):
+        return self._supported(path)
+
+    def _supported(self, path):
+        if path.endswith(_CLASS_SUFFIX):
+            accepted = self.path_filter.accept_class(path)
+        elif path.endswith(_ARCHIVE_SUFFIXES) or path.endswith(_TAR_SUFFIXES) or _is_jimage(path):
+            accepted = self.path_filter.accept_archive(path)
+        else:
             return False
-        
-        #TODO: Additional filters (skip selected libraries for example)
-        return True 
+        if not accepted:
+            self._prune(path)
+        return accepted
+
+    def _prune(self, path):
+        log.debug('Skipping: %s', path)
+        self.pruned += 1
+
+    def _failed(self, origin, offset=None):
+        """Handles the error being processed: records origin in the quarantine or re-raises the error (no quarantine)."""
+        if self.quarantine is None:
+            raise
+        self.quarantine.add(origin, sys.exc_info()[1], offset)
     
     def scan(self, root):
         """Scans specified directory for selected Java artifacts."""
         
         log.info('Scanning: root=%s', root)
 
-        # TODO: Iterative implementation + archive stack (ability to resolve class origin)
         classes = 0
+        for record in self.iter_classes(root):
+            self._process_class(record.origin, record.data, record.fingerprint)
+            classes += 1
+
+        return classes 
+
+    def iter_classes(self, root):
+        """Yields a ClassRecord for every class found under root, archive entries included.
+
+        Record data is only valid until the next record is requested - use ClassRecord.read() 
+        to keep the content. If workers are set and ordered is not, the whole tree is enumerated 
+        first and archives are read in size-aware order (see _iter_scheduled)."""
+        if self.workers > 0 and not self.ordered and not self.extract:
+            return self._iter_scheduled(root)
+        return self._iter_sequential(root)
+
+    def iter_archives(self, root):
+        """Yields (origin, reader) for every archive found under root, nested ones included.
+
+        Classes are not read, so callers can look at archive metadata (manifests, module 
+        descriptors) only. A reader is valid until the next archive is requested."""
+        for path, base in self._walk_files(root):
+            if not path.endswith(_CLASS_SUFFIX):
+                for archive in self._walk_archive(path, read_classes=False):
+                    yield archive
+
+    def _iter_sequential(self, root):
+        for path, base in self._walk_files(root):
+            if path.endswith(_CLASS_SUFFIX):
+                record = self._loose_class(path, base)
+                if record is not None:
+                    yield record
+            else:
+                for record in self._walk_archive(path):
+                    yield record
+
+    def _walk_files(self, root):
+        """Yields (path, base) for the class files and archives found under root.
+
+        Directories are traversed with an explicit stack, relying on the file type information 
+        returned by scandir (no extra stat calls). In extract mode archives are unpacked and 
+        pushed on the stack instead. Names of loose files are relative to the scanned (or 
+        extracted) directory, base is the length of its path prefix."""
         if os.path.isfile(root):
-            if self.supported_file(root):
-                classes += self._process_artifact(root)
+            files = [(root, len(os.path.join(os.path.dirname(root), '')))] if self.supported_file(root) else []
+            dirs = []
         elif os.path.isdir(root):
-            for dirpath, dirnames, filenames in os.walk(root):
-                for f in filenames:
-                    path = os.path.join(dirpath, f)
-                    if self.supported_file(path):
-                        classes += self._process_artifact(path)
+            files = []
+            dirs = [(root, len(os.path.join(root, '')))]
         else:
             raise AssertionError('Directory or a regular file expected: %s' % root)
 
-        return classes 
+        while files or dirs:
+            if not files:
+                path, base = dirs.pop()
+                try:
+                    entries = scandir(path)
+                except EnvironmentError as e:
+                    # Like os.walk, skip directories that can't be listed (unless quarantined)
+                    if self.quarantine is None:
+                        log.warn('Skipped directory: %s (%s)', path, e)
+                    else:
+                        self._failed(path)
+                    continue
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.path_filter.accept_dir(entry.path):
+                            dirs.append((entry.path, base))
+                        else:
+                            self._prune(entry.path)
+                    elif (entry.name.endswith(_SUPPORTED_SUFFIXES) or entry.name == JIMAGE_NAME) and entry.is_file() and self._supported(entry.path):
+                        files.append((entry.path, base))
+                continue
 
-    def _process_artifact(self, path):
-        if re.match(_PATTERN_ARCHIVE, path):
-            archive_dir = self._unpack(path)
-            if archive_dir == None:
-                # Don't process, if it's a duplicate
-                return 0
+            path, base = files.pop()
+            if self.extract and (path.endswith(_ARCHIVE_SUFFIXES) or path.endswith(_TAR_SUFFIXES)):
+                try:
+                    target_dir = self._unpack(path)
+                except Exception:
+                    self._failed(path)
+                    continue
+                if target_dir is not None:
+                    dirs.append((target_dir, len(os.path.join(target_dir, ''))))
+            else:
+                yield path, base
+
+    def _iter_scheduled(self, root):
+        """Yields a ClassRecord for every class found under root, reading archives in the thread pool.
+
+        All archives are enumerated up front (central directories only) and split into tasks: 
+        chunks of class entries costing up to _CHUNK_COST and nested archives to open. Tasks run 
+        largest-first (LPT), so a huge archive found last does not leave the pool idle at the end 
+        of the scan. Archives discovered inside others are scheduled as soon as they are opened. 
+        Records come in completion order; loose class files are reported while tasks are running. 
+        Tar bundles are streamed during the enumeration (see _walk_tar)."""
+        loose = []
+        heap = []
+        sequence = itertools.count()
+        sources = []
+        for path, base in self._walk_files(root):
+            if path.endswith(_CLASS_SUFFIX):
+                loose.append((path, base))
+                continue
+            if path.endswith(_TAR_SUFFIXES):
+                # A stream cannot be split into tasks - read it while enumerating
+                for record in self._walk_tar(path):
+                    yield record
+                continue
+            source = _ArchiveSource(path)
+            sources.append(source)
+            try:
+                if not self._duplicate_archive(source.open(), path):
+                    self._schedule(heap, sequence, source, path)
+            except Exception:
+                self._failed(path)
+            finally:
+                # Reopened by the first task - keeps the number of open files low
+                source.close()
+                source.release()
+        log.debug('Scheduled %d archives (%d tasks)', len(sources), len(heap))
+        loose.reverse()
+
+        results = Queue.Queue()
+        def run(task):
+            try:
+                results.put((task, self._run_task(task), None))
+            except:
+                results.put((task, None, sys.exc_info()))
 
-            return self.scan(archive_dir)
+        in_flight = 0
+        try:
+            while heap or in_flight:
+                while heap and in_flight < self.workers * 2:
+                    task = heapq.heappop(heap)[2]
+                    task[1].open()
+                    self.pool.apply_async(run, (task,))
+                    in_flight += 1
+
+                try:
+                    task, result, error = results.get_nowait()
+                except Queue.Empty:
+                    if loose:
+                        record = self._loose_class(*loose.pop())
+                        if record is not None:
+                            yield record
+                        continue
+                    task, result, error = results.get()
+                in_flight -= 1
+                
+                action, source, entries, origin = task
+                if error is not None:
+                    raise error[0], error[1], error[2]
+                if action == _SCAN:
+                    for record in result:
+                        yield record
+                elif result is not None:
+                    nested_origin, nested_archive, spill_path = result
+                    nested_source = _ArchiveSource(reader=nested_archive, spill_path=spill_path, 
+                                                   parent=source if spill_path is None else None)
+                    sources.append(nested_source)
+                    if not self._duplicate_archive(nested_archive, nested_origin):
+                        self._schedule(heap, sequence, nested_source, nested_origin)
+                    nested_source.release()
+                source.release()
+
+            while loose:
+                record = self._loose_class(*loose.pop())
+                if record is not None:
+                    yield record
+        finally:
+            # Tasks still running may use the archives
+            while in_flight:
+                task, result, error = results.get()
+                in_flight -= 1
+                if task[0] == _OPEN and result is not None:
+                    # Opened after the scan stopped - nobody else owns it
+                    nested_origin, nested_archive, spill_path = result
+                    self._close_jar(nested_archive, spill_path)
+            for source in sources:
+                source.close()
+
+    def _schedule(self, heap, sequence, source, origin):
+        """Splits the work of an open archive into tasks and adds them to the heap."""
+        def push(cost, action, entries):
+            source.users += 1
+            # Largest first, ties in archive order
+            heapq.heappush(heap, (-cost, next(sequence), (action, source, entries, origin)))
+
+        chunk = []
+        chunk_cost = 0
+        superseded = self._superseded_entries(source.reader, origin)
+        for entry in source.reader:
+            name = entry.name
+            if name.endswith(_CLASS_SUFFIX):
+                if not self._accept_entry(origin, source.reader, entry, superseded):
+                    continue
+                cost = entry.file_size + _ENTRY_COST
+                if chunk and (chunk_cost + cost > _CHUNK_COST or len(chunk) >= _PARALLEL_BATCH_SIZE):
+                    push(chunk_cost, _SCAN, chunk)
+                    chunk = []
+                    chunk_cost = 0
+                chunk.append(entry)
+                chunk_cost += cost
+            elif name.endswith(_ARCHIVE_SUFFIXES) and self._supported(origin + '!/' + name):
+                if entry.file_size > self.spill_threshold:
+                    # Create the work directory before worker threads need it
+                    self.work_dir
+                push(entry.file_size, _OPEN, entry)
+        if chunk:
+            push(chunk_cost, _SCAN, chunk)
+
+    def _run_task(self, task):
+        """Runs a scheduled task (in a worker thread)."""
+        action, source, entries, origin = task
+        archive = source.reader
+        if action == _SCAN:
+            records = (self._read_entry(archive, entry, origin) for entry in entries)
+            return [it for it in records if it is not None]
         else:
-            assert path.endswith('.class')
-            self._process_class(path)
-            return 1
+            nested_origin = origin + '!/' + entries.name
+            try:
+                nested_archive, spill_path = self._open_nested_jar(archive, entries, nested_origin)
+            except Exception:
+                self._failed(nested_origin, archive.entry_offset(entries))
+                return None
+            return (nested_origin, nested_archive, spill_path)
+
+    def _loose_class(self, path, base):
+        """Returns a ClassRecord for a class file, reading it if read_files is set. Returns None if it was quarantined."""
+        if self._read_buffer is None:
+            return ClassRecord(path, path[base:], None, None, None)
+        try:
+            data = self._read_buffer.read(path)
+        except EnvironmentError:
+            self._failed(path)
+            return None
+        return ClassRecord(path, path[base:], len(data), data, None)
 
-    def _process_class(self, path):
-        if self.callback is None:
+    def _process_class(self, path, data=None, fingerprint=None):
+        if self.data_callback is not None:
+            self.data_callback(path, data, fingerprint)
+        elif self.callback is not None:
+            self.callback(path)
+        else:
             raise AssertionError('Invalid callback.')
-        self.callback(path)
+
+    def _walk_archive(self, path, read_classes=True):
+        """Yields a ClassRecord for the classes of an archive (or a tar bundle) and all archives 
+        nested in it (or an (origin, reader) tuple for every archive if read_classes is not set)."""
+        if path.endswith(_TAR_SUFFIXES):
+            for record in self._walk_tar(path, read_classes):
+                yield record
+            return
+        try:
+            archive = _open_archive(path)
+        except Exception:
+            self._failed(path)
+            return
+        for record in self._walk_open_archive(archive, path, None, read_classes):
+            yield record
+
+    def _walk_open_archive(self, archive, path, spill_path, read_classes):
+        """Walks an open archive and the archives nested in it (see _walk_archive). Closes it when done.
+
+        Nested archives are handled with an explicit archive stack. In-memory nested archives are 
+        slices of their parents, so a reader is closed (and its spill file removed) only after 
+        everything nested in it has been read."""
+        # Stack items: (action, archive, entry, origin) - for _CLOSE, origin is the spill file (if any)
+        stack = [(_CLOSE, archive, None, spill_path)]
+        if not self._duplicate_archive(archive, path):
+            log.info('Reading: %s', path)
+            stack.append((_SCAN, archive, None, path))
+
+        try:
+            while stack:
+                action, archive, entry, origin = stack.pop()
+                if action == _SCAN:
+                    if read_classes:
+                        for record in self._read_classes(archive, origin):
+                            yield record
+                    else:
+                        yield (origin, archive)
+                    nested_entries = [it for it in archive if it.name.endswith(_ARCHIVE_SUFFIXES) and self._supported(origin + '!/' + it.name)]
+                    for entry in reversed(nested_entries):
+                        stack.append((_OPEN, archive, entry, origin + '!/' + entry.name))
+                elif action == _OPEN:
+                    try:
+                        nested_archive, spill_path = self._open_nested_jar(archive, entry, origin)
+                    except Exception:
+                        self._failed(origin, archive.entry_offset(entry))
+                        continue
+                    if spill_path is not None:
+                        stack.append((_CLOSE, nested_archive, None, spill_path))
+                    if not self._duplicate_archive(nested_archive, origin):
+                        stack.append((_SCAN, nested_archive, None, origin))
+                else:
+                    self._close_jar(archive, origin)
+        finally:
+            # Stopped early - release whatever is still open
+            for action, archive, entry, origin in reversed(stack):
+                if action == _CLOSE:
+                    self._close_jar(archive, origin)
+
+    def _walk_tar(self, path, read_classes=True):
+        """Yields a ClassRecord for the classes of a tar bundle (plain or compressed) and all 
+        archives in it, reading the bundle in a single forward pass (see _walk_archive).
+
+        Nothing is extracted: class entries are read as they stream past, archives are read into 
+        memory (or spilled to a temporary file if larger than spill_threshold) and walked like 
+        nested archives, tar bundles in the bundle are streamed in turn. Tar entries carry no 
+        checksums, so class fingerprints are computed from the content."""
+        try:
+            bundle = tarfile.open(path, 'r|*')
+        except Exception:
+            self._failed(path)
+            return
+        log.info('Reading: %s (stream)', path)
+        try:
+            for record in self._walk_tar_stream(bundle, path, read_classes):
+                yield record
+        finally:
+            bundle.close()
+
+    def _walk_tar_stream(self, bundle, origin, read_classes):
+        try:
+            for member in bundle:
+                if not member.isfile():
+                    continue
+                name = member.name[2:] if member.name.startswith('./') else member.name
+                path = origin + '!/' + name
+                if name.endswith(_CLASS_SUFFIX):
+                    if read_classes and self._accept_bundle_class(path):
+                        data = bundle.extractfile(member).read()
+                        yield ClassRecord(path, name, len(data), data, (name, zlib.crc32(data) & 0xffffffff, len(data)))
+                elif name.endswith(_ARCHIVE_SUFFIXES) and self._supported(path):
+                    try:
+                        archive, spill_path = self._open_tar_member(bundle, member, path)
+                    except Exception:
+                        self._failed(path, member.offset)
+                        continue
+                    for record in self._walk_open_archive(archive, path, spill_path, read_classes):
+                        yield record
+                elif name.endswith(_TAR_SUFFIXES) and self._supported(path):
+                    log.info('Reading: %s (stream)', path)
+                    nested_bundle = tarfile.open(fileobj=bundle.extractfile(member), mode='r|*')
+                    for record in self._walk_tar_stream(nested_bundle, path, read_classes):
+                        yield record
+        except Exception:
+            # The rest of the stream is lost
+            self._failed(origin)
+
+    def _accept_bundle_class(self, path):
+        """Checks a class entry of a bundle against the path filter.
+
+        Bundle entries are not rooted at the class path (e.g. product-1.0/classes/a/B.class), so 
+        their class names are not known and the class filter does not apply - like loose files."""
+        if not self.path_filter.accept_class(path):
+            self._prune(path)
+            return False
+        return True
+
+    def _open_tar_member(self, bundle, member, origin):
+        """Opens an archive streaming past in a tar bundle. Returns the reader and its spill file (if any)."""
+        # Logged as read by _walk_open_archive
+        if member.size <= self.spill_threshold:
+            return JarReader(bundle.extractfile(member).read(), origin), None
+
+        (fd, spill_path) = tempfile.mkstemp(suffix='-' + os.path.basename(member.name), dir=self.work_dir)
+        try:
+            log.debug('Spilling: %s to %s', origin, spill_path)
+            with os.fdopen(fd, 'wb') as spill_file:
+                shutil.copyfileobj(bundle.extractfile(member), spill_file)
+            return JarReader.open(spill_path), spill_path
+        except:
+            os.remove(spill_path)
+            raise
+
+    def _read_classes(self, archive, origin):
+        """Yields a ClassRecord for the class entries of an open archive."""
+        if self.workers > 0:
+            for record in self._read_classes_parallel(archive, origin):
+                yield record
+            return
+
+        superseded = self._superseded_entries(archive, origin)
+        for entry in archive:
+            if entry.name.endswith(_CLASS_SUFFIX) and self._accept_entry(origin, archive, entry, superseded):
+                record = self._read_entry(archive, entry, origin)
+                if record is not None:
+                    yield record
+
+    def _read_classes_parallel(self, archive, origin):
+        """Yields a ClassRecord for the class entries of an open archive, inflating them in the thread pool.
+
+        Records are yielded in archive order if ordered is set, otherwise as soon as they are ready."""
+        superseded = self._superseded_entries(archive, origin)
+        class_entries = [it for it in archive if it.name.endswith(_CLASS_SUFFIX) and self._accept_entry(origin, archive, it, superseded)]
+        
+        def inflate(entries):
+            records = (self._read_entry(archive, entry, origin) for entry in entries)
+            return [it for it in records if it is not None]
+
+        pool = self.pool
+        done = Queue.Queue()
+        def run(entries):
+            try:
+                done.put((inflate(entries), None))
+            except:
+                done.put((None, sys.exc_info()))
+
+        for batch_start in xrange(0, len(class_entries), _PARALLEL_BATCH_SIZE):
+            batch = class_entries[batch_start:batch_start + _PARALLEL_BATCH_SIZE]
+            if not any(it.method == DEFLATED for it in batch):
+                # Nothing to inflate - stored entries are slices of the archive
+                for record in inflate(batch):
+                    yield record
+                continue
+
+            chunk_size = max(1, len(batch) // (self.workers * 4))
+            chunks = [batch[it:it + chunk_size] for it in xrange(0, len(batch), chunk_size)]
+            jobs = []
+            try:
+                if self.ordered:
+                    jobs = [pool.apply_async(inflate, (it,)) for it in chunks]
+                    for job in jobs:
+                        for record in job.get():
+                            yield record
+                else:
+                    jobs = [pool.apply_async(run, (it,)) for it in chunks]
+                    for job in jobs:
+                        records, error = done.get()
+                        if error is not None:
+                            raise error[0], error[1], error[2]
+                        for record in records:
+                            yield record
+            finally:
+                # Stopped early - the archive is closed next, wait for the jobs still reading it
+                for job in jobs:
+                    job.wait()
+
+    def _read_entry(self, archive, entry, origin):
+        """Reads a class entry (in a worker thread in parallel modes). Returns None if it was quarantined."""
+        path = origin + '!/' + entry.name
+        try:
+            data = archive.read(entry)
+        except Exception:
+            self._failed(path, archive.entry_offset(entry))
+            return None
+        return ClassRecord(path, entry.name, entry.file_size, data, _fingerprint(entry))
+
+    def _superseded_entries(self, archive, origin):
+        """Returns the names of the class entries of a multi-release jar not selected for the target release."""
+        if not archive.multi_release:
+            return frozenset()
+
+        selected = {}
+        superseded = set()
+        for entry in archive:
+            name = entry.name
+            if not name.endswith(_CLASS_SUFFIX):
+                continue
+            root = _PATTERN_VERSIONED_ROOT.match(name)
+            if root is None:
+                version = 0
+                key = name
+            else:
+                version = int(root.group(1))
+                if self.release is None or version > self.release:
+                    superseded.add(name)
+                    continue
+                key = name[root.end():]
+            current = selected.get(key)
+            if current is None:
+                selected[key] = (version, name)
+            elif version > current[0]:
+                superseded.add(current[1])
+                selected[key] = (version, name)
+            else:
+                superseded.add(name)
+
+        log.debug('Multi-release: %s release=%s superseded=%d', origin, self.release, len(superseded))
+        self.superseded += len(superseded)
+        return superseded
+
+    def _accept_entry(self, origin, archive, entry, superseded):
+        """Checks a class entry against the multi-release selection, the path filter and the class filter."""
+        if entry.name in superseded:
+            return False
+        path = origin + '!/' + entry.name
+        if origin.endswith(_BUNDLE_SUFFIX):
+            return self._accept_bundle_class(path)
+        if not self.path_filter.accept_class(path):
+            self._prune(path)
+            return False
+        if self.class_filter is not None:
+            resource_name = archive.resource_name(entry)
+            plain_root = not origin.endswith(_MODULE_SUFFIXES)
+            class_name = entry_class_name(resource_name, plain_root) if resource_name is not None else None
+            if class_name is not None and not self.class_filter(class_name):
+                log.debug('Rejected: %s', path)
+                self.rejected += 1
+                return False
+        return True
+
+    def _duplicate_archive(self, archive, origin):
+        """Checks (and records) if an identical archive was already scanned."""
+        fingerprint = archive.fingerprint()
+        first_origin = self._archives.get(fingerprint)
+        if first_origin is not None:
+            log.warn('Duplicate library: %s (identical to %s)', origin, first_origin)
+            self.duplicates.append((origin, first_origin))
+            return True
+        self._archives[fingerprint] = origin
+        return False
+
+    def _open_nested_jar(self, archive, entry, origin):
+        """Opens an archive nested in another one. Returns the reader and its spill file (if any).
+
+        Archives up to spill_threshold bytes (uncompressed) are opened in memory, larger ones 
+        are copied to a temporary file first."""
+        if entry.file_size <= self.spill_threshold:
+            # STORED archives are just slices of the outer one, DEFLATED ones are inflated into memory
+            log.info('Reading: %s', origin)
+            return JarReader(archive.read(entry), origin), None
+
+        (fd, spill_path) = tempfile.mkstemp(suffix='-' + os.path.basename(entry.name), dir=self.work_dir)
+        try:
+            log.info('Reading: %s (spilled to %s)', origin, spill_path)
+            with os.fdopen(fd, 'wb') as spill_file:
+                archive.copy(entry, spill_file)
+            return JarReader.open(spill_path), spill_path
+        except:
+            os.remove(spill_path)
+            raise
+
+    def _close_jar(self, archive, spill_path):
+        archive.close()
+        if spill_path is not None:
+            os.remove(spill_path)
 
     def _unpack(self, path):
+        """Extracts an archive (or a tar bundle) to a new temporary directory. Returns None for duplicate archives."""
         basename = os.path.basename(path)
-        target_dir = os.path.join(self._work_dir, basename)
-       
-        if os.path.isdir(target_dir):
-            log.warn('Duplicate library: %s', basename)
-            return None
+        if path.endswith(_TAR_SUFFIXES):
+            target_dir = tempfile.mkdtemp(prefix=basename + '-', dir=self.work_dir)
+            with closing(tarfile.open(path)) as bundle:
+                log.info('Extracting: %s to %s', basename, target_dir)
+                # Regular files and directories only, none outside of the target directory
+                members = [it for it in bundle if (it.isfile() or it.isdir()) and not os.path.isabs(it.name) and '..' not in it.name.split('/')]
+                bundle.extractall(target_dir, members)
+            return target_dir
+
+        archive = JarReader.open(path)
+        try:
+            if self._duplicate_archive(archive, path):
+                return None
+        finally:
+            archive.close()
 
+        # Different archives may share a name
+        target_dir = tempfile.mkdtemp(prefix=basename + '-', dir=self.work_dir)
+       
         archive = zipfile.ZipFile(path)
         try:
             log.info('Extracting: %s to %s', basename, target_dir) 
@@ -118,7 +949,7 @@ class JavaScanner(object):
 
 if __name__ == '__main__':
     if len(sys.argv) != 2:
-        sys.stderr.write('Usage %s <class|jar|war|ear|root_dir>\n' % __file__)
+        sys.stderr.write('Usage %s <class|jar|war|ear|jmod|modules|zip|tar|tar.gz|tgz|root_dir>\n' % __file__)
         sys.exit(1)
 
     target_path = sys.argv[1]
@@ -129,5 +960,6 @@ if __name__ == '__main__':
     def print_result_callback(path): 
         print path
 
-    with JavaScanner(print_result_callback) as scanner:
+    # Entry origins are printed as they are, no need to extract archives
+    with JavaScanner(print_result_callback, extract=False) as scanner:
         scanner.scan(target_path)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+from collections import namedtuple
+
+from jar_reader import STORED, DEFLATED
+
+log = logging.getLogger('jimage')
+
+# Name of the JDK runtime image ($JAVA_HOME/lib/modules)
+JIMAGE_NAME = 'modules'
+
+_MAGIC = 0xCAFEDADA
+_COMPRESSED_MAGIC = 0xCAFEFAFA
+_MAJOR_VERSION = 1
+
+# Location attribute kinds
+_ATTRIBUTE_END = 0
+_ATTRIBUTE_MODULE = 1
+_ATTRIBUTE_PARENT = 2
+_ATTRIBUTE_BASE = 3
+_ATTRIBUTE_EXTENSION = 4
+_ATTRIBUTE_OFFSET = 5
+_ATTRIBUTE_COMPRESSED = 6
+_ATTRIBUTE_UNCOMPRESSED = 7
+_ATTRIBUTE_COUNT = 8
+
+_HASH_MULTIPLIER = 0x01000193
+
+# Resource location. The method tells if the resource has to be decompressed (DEFLATED) or not.
+JImageEntry = namedtuple('JImageEntry', 'name module method crc compressed_size file_size offset')
+
+def jimage_hash(name, seed=_HASH_MULTIPLIER):
+    """Returns the hash of a (UTF-8 encoded) resource name, as used by the jimage index."""
+    for ch in bytearray(name):
+        seed = ((seed * _HASH_MULTIPLIER) ^ ch) & 0xffffffff
+    return seed & 0x7fffffff
+
+class JImageReader(object):
+    """A reader of the JDK runtime image container (jimage, $JAVA_HOME/lib/modules).
+
+    The container is memory-mapped. Its index (a perfect hash table of resource locations)
+    is used directly for lookups, resources are read as buffer slices of the map or
+    decompressed if the image was built with compression. Entries are named module/path
+    (java.base/java/lang/Object.class). Implements the JarReader interface used by the scanner.
+    """
+
+    def __init__(self, data, name='<buffer>'):
+        """Initializes a new instance of the JImageReader class using a buffer-like object (str, buffer, mmap)."""
+        self.name = name
+        self._data = data
+        self._file = None
+        self._parse_header(data)
+        self._entries = None
+        # Modules are never multi-release
+        self.multi_release = False
+
+    @classmethod
+    def open(cls, path):
+        """Opens and memory-maps an image file."""
+        f = open(path, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise AssertionError('Invalid image (empty file): %s' % path)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            f.close()
+            raise
+        try:
+            reader = cls(data, path)
+        except:
+            data.close()
+            f.close()
+            raise
+        reader._file = f
+        return reader
+
+    @staticmethod
+    def is_jimage(path):
+        """Checks if a file starts with the jimage magic number (in either byte order)."""
+        with open(path, 'rb') as f:
+            magic = f.read(4)
+        return len(magic) == 4 and _MAGIC in (struct.unpack('<I', magic)[0], struct.unpack('>I', magic)[0])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return self._resource_count
+
+    @property
+    def entries(self):
+        """Returns all resource locations (decoded on first use)."""
+        if self._entries is None:
+            self._entries = [self._entry(index) for index in xrange(self._table_length)]
+            log.debug('Image index: %s entries=%d', self.name, len(self._entries))
+        return self._entries
+
+    def close(self):
+        """Releases the underlying memory map (if any)."""
+        if self._file is not None:
+            self._data.close()
+            self._file.close()
+            self._file = None
+        self._data = None
+
+    def fingerprint(self):
+        """Returns a content fingerprint based on the image header and index."""
+        return hashlib.sha1(self._data[0:self._index_size]).hexdigest()
+
+    def resource_name(self, entry):
+        """Returns the entry path within its module (java/lang/Object.class)."""
+        return entry.name[len(entry.module) + 1:]
+
+    def find(self, name):
+        """Looks up a resource by name (java.base/java/lang/Object.class) using the image index. Returns None if not found."""
+        full_name = '/' + name
+        table_length = self._table_length
+        if table_length == 0:
+            return None
+        index = self._redirect.unpack_from(self._data, self._redirect_offset + 4 * (jimage_hash(full_name) % table_length))[0]
+        if index < 0:
+            index = -1 - index
+        elif index > 0:
+            index = jimage_hash(full_name, index) % table_length
+        else:
+            return None
+        entry = self._entry(index)
+        return entry if entry.name == name else None
+
+    def entry_offset(self, entry):
+        """Returns the position of a resource in the image file."""
+        return self._index_size + entry.offset
+
+    def raw(self, entry):
+        """Returns (possibly compressed) entry data as a buffer slice."""
+        size = entry.compressed_size if entry.method != STORED else entry.file_size
+        return buffer(self._data, self._index_size + entry.offset, size)
+
+    def read(self, entry):
+        """Returns entry content: a buffer slice for uncompressed resources, a string for compressed ones."""
+        data = self.raw(entry)
+        while entry.method != STORED and len(data) >= self._compressed_header.size:
+            (magic, compressed_size, file_size, decompressor, config, terminal) = self._compressed_header.unpack_from(data, 0)
+            if magic != _COMPRESSED_MAGIC:
+                break
+            decompressor_name = self._string(decompressor)
+            if decompressor_name != 'zip':
+                raise AssertionError('Unsupported image compression %s: %s!/%s' % (decompressor_name, self.name, entry.name))
+            start = self._compressed_header.size
+            data = zlib.decompress(data[start:start + compressed_size], zlib.MAX_WBITS, file_size or 1)
+        return data
+
+    def _parse_header(self, data):
+        for order in '<>':
+            header = struct.Struct(order + 'IIIIIII')
+            if len(data) < header.size:
+                raise AssertionError('Invalid image (header): %s' % self.name)
+            (magic, version, flags, resource_count, table_length,
+             locations_size, strings_size) = header.unpack_from(data, 0)
+            if magic == _MAGIC:
+                break
+        else:
+            raise AssertionError('Invalid image (magic): %s' % self.name)
+        if version >> 16 != _MAJOR_VERSION:
+            raise AssertionError('Unsupported image version %d.%d: %s' % (version >> 16, version & 0xffff, self.name))
+
+        self._redirect = struct.Struct(order + 'i')
+        self._u4 = struct.Struct(order + 'I')
+        self._compressed_header = struct.Struct(order + 'IQQIIB')
+        self._resource_count = resource_count
+        self._table_length = table_length
+        self._redirect_offset = header.size
+        self._offsets_offset = self._redirect_offset + 4 * table_length
+        self._locations_offset = self._offsets_offset + 4 * table_length
+        self._strings_offset = self._locations_offset + locations_size
+        self._index_size = self._strings_offset + strings_size
+        if self._index_size > len(data):
+            raise AssertionError('Invalid image (index size): %s' % self.name)
+
+    def _string(self, offset):
+        data = self._data
+        start = self._strings_offset + offset
+        return data[start:data.find('\0', start)]
+
+    def _entry(self, index):
+        """Decodes the location stored at the specified index of the table."""
+        data = self._data
+        offset = self._locations_offset + self._u4.unpack_from(data, self._offsets_offset + 4 * index)[0]
+        attributes = [0] * _ATTRIBUTE_COUNT
+        while True:
+            byte = ord(data[offset])
+            kind = byte >> 3
+            if kind == _ATTRIBUTE_END:
+                break
+            if kind >= _ATTRIBUTE_COUNT:
+                raise AssertionError('Invalid image (location attribute %d): %s' % (kind, self.name))
+            value = 0
+            for value_byte in bytearray(data[offset + 1:offset + 2 + (byte & 0x7)]):
+                value = (value << 8) | value_byte
+            attributes[kind] = value
+            offset += 2 + (byte & 0x7)
+
+        module = self._string(attributes[_ATTRIBUTE_MODULE])
+        parent = self._string(attributes[_ATTRIBUTE_PARENT])
+        name = self._string(attributes[_ATTRIBUTE_BASE])
+        extension = self._string(attributes[_ATTRIBUTE_EXTENSION])
+        if parent:
+            name = parent + '/' + name
+        if extension:
+            name = name + '.' + extension
+        if module:
+            name = module + '/' + name
+        compressed_size = attributes[_ATTRIBUTE_COMPRESSED]
+        return JImageEntry(name, module, DEFLATED if compressed_size else STORED, None,
+                           compressed_size, attributes[_ATTRIBUTE_UNCOMPRESSED], attributes[_ATTRIBUTE_OFFSET])
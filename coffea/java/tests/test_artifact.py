@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from coffea.java.artifact import Artifact, ArtifactIndex, header_names, read_artifacts
+from coffea.java.jar_reader import JarReader
+from coffea.java.jimage_reader import JImageReader
+from coffea.java.tests.test_java_class import module_info_class
+from coffea.java.tests.test_jimage_reader import write_jimage
+
+def write_jar(path, manifest=None, entries=[]):
+    """Writes a jar with a manifest (main attributes as a list of (name, value) pairs) and other (name, content) entries."""
+    zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+    if manifest is not None:
+        zf.writestr('META-INF/MANIFEST.MF', ''.join('%s: %s\r\n' % it for it in manifest) + '\r\n')
+    for name, content in entries:
+        zf.writestr(name, content)
+    zf.close()
+    return path
+
+class TestArtifact(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _read(self, path):
+        with JarReader.open(path) as archive:
+            return read_artifacts(archive, path)
+
+    def test_header_names(self):
+        self.assertEquals(header_names('com.a;version="[1.0,2.0)",com.b;com.c;resolution:=optional, com.d'), 
+                          ['com.a', 'com.b', 'com.c', 'com.d'])
+        self.assertEquals(header_names('com.example.bundle;singleton:=true'), ['com.example.bundle'])
+        self.assertEquals(header_names(''), [])
+
+    def test_modular_jar(self):
+        path = write_jar(os.path.join(self._tmpdir, 'app.jar'), 
+                         [('Manifest-Version', '1.0'), ('Class-Path', 'lib/util.jar lib/My%20Lib.jar classes/')],
+                         [('module-info.class', module_info_class('com.example.app', ['java.base', 'com.example.util'], ['com/example/app'])),
+                          ('com/example/app/Main.class', ''), ('com/example/app/Main$1.class', '')])
+        self.assertEquals(self._read(path), [Artifact('app.jar', path, 'com.example.app', ['util.jar', 'My Lib.jar'], 
+                                                      ['java.base', 'com.example.util'], ['com.example.app'], [], 3)])
+
+    def test_automatic_module(self):
+        path = write_jar(os.path.join(self._tmpdir, 'util.jar'), [('Automatic-Module-Name', 'com.example.util')])
+        self.assertEquals(self._read(path), [Artifact('util.jar', path, 'com.example.util', [], [], [], [], 0)])
+
+        path = write_jar(os.path.join(self._tmpdir, 'plain.jar'), entries=[('A.class', '')])
+        self.assertEquals(self._read(path), [Artifact('plain.jar', path, None, [], [], [], [], 1)])
+
+    def test_bundle(self):
+        path = write_jar(os.path.join(self._tmpdir, 'bundle.jar'), 
+                         [('Bundle-SymbolicName', 'com.example.bundle;singleton:=true'),
+                          ('Export-Package', 'com.example.bundle.api;version="1.0"'),
+                          ('Import-Package', 'com.example.app,org.osgi.framework;version="[1.8,2)"'),
+                          ('Require-Bundle', 'com.example.util;bundle-version="1.0"')])
+        self.assertEquals(self._read(path), [Artifact('bundle.jar', path, 'com.example.bundle', [], ['com.example.util'], 
+                                                      ['com.example.bundle.api'], ['com.example.app', 'org.osgi.framework'], 0)])
+
+    def test_versioned_module(self):
+        path = write_jar(os.path.join(self._tmpdir, 'mr.jar'), [('Multi-Release', 'true')],
+                         [('META-INF/versions/9/module-info.class', module_info_class('com.example.mr9')),
+                          ('META-INF/versions/11/module-info.class', module_info_class('com.example.mr11'))])
+        self.assertEquals(self._read(path)[0].module, 'com.example.mr11')
+
+    def test_image(self):
+        path = write_jimage(os.path.join(self._tmpdir, 'modules'), 
+                            [('/java.base/module-info.class', module_info_class('java.base', [], ['java/lang'])),
+                             ('/java.base/java/lang/Object.class', ''),
+                             ('/java.sql/module-info.class', module_info_class('java.sql', ['java.base'], ['java/sql'])),
+                             ('/java.sql/java/sql/Driver.class', ''),
+                             ('/packages/java.lang/java.base', '')])
+        with JImageReader.open(path) as archive:
+            artifacts = sorted(read_artifacts(archive, path))
+        self.assertEquals(artifacts, [Artifact('java.base', path + '!/java.base', 'java.base', [], [], ['java.lang'], [], 2),
+                                      Artifact('java.sql', path + '!/java.sql', 'java.sql', [], ['java.base'], ['java.sql'], [], 2)])
+
+    def test_index(self):
+        app = Artifact('app.jar', 'app.jar', 'com.example.app', ['util.jar', 'missing.jar'], ['java.base', 'com.example.util'], 
+                       ['com.example.app'], [], 1)
+        util = Artifact('util-1.0.jar', 'util-1.0.jar', 'com.example.util', [], [], [], [], 1)
+        bundle = Artifact('bundle.jar', 'bundle.jar', 'com.example.bundle', [], [], ['com.example.bundle'], 
+                          ['com.example.app', 'com.example.bundle', 'org.osgi.framework'], 1)
+        index = ArtifactIndex([app, util, bundle])
+        self.assertEquals(index.dependencies(app), set(['util.jar', 'missing.jar', 'java.base', 'util-1.0.jar']))
+        self.assertEquals(index.dependencies(util), set())
+        self.assertEquals(index.dependencies(bundle), set(['app.jar', 'org.osgi.framework']))
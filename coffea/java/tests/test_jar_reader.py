@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from coffea.java.jar_reader import JarReader, STORED, DEFLATED, parse_manifest
+from coffea.java.tests import __file__ as test_directory
+
+data_dir = os.path.join(os.path.dirname(test_directory), 'data')
+
+class TestJarReader(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self.contents = {}
+        for name in ['SimplePOJO.class', 'Java8Sample.class', 'SimplePOJO.java']:
+            with open(os.path.join(data_dir, name), 'rb') as f:
+                self.contents[name] = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _mkjar(self, name, compression, prefix=''):
+        path = os.path.join(self._tmpdir, name)
+        zf = zipfile.ZipFile(path, 'w', compression)
+        zf.writestr('META-INF/', '')
+        for entry, content in sorted(self.contents.items()):
+            zf.writestr('com/example/' + entry, content)
+        zf.close()
+        if prefix:
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path, 'wb') as f:
+                f.write(prefix + data)
+        return path
+
+    def _assert_entries(self, reader, method):
+        self.assertEquals(len(reader), 4)
+        self.assertEquals(reader.entries[0].name, 'META-INF/')
+        for entry in reader.entries[1:]:
+            self.assertEquals(entry.method, method)
+            self.assertEquals(str(reader.read(entry)), self.contents[entry.name.replace('com/example/', '')])
+            self.assertEquals(entry.file_size, len(self.contents[entry.name.replace('com/example/', '')]))
+
+    def test_stored(self):
+        with JarReader.open(self._mkjar('stored.jar', zipfile.ZIP_STORED)) as reader:
+            self._assert_entries(reader, STORED)
+            self.assertIsInstance(reader.read(reader.entries[1]), buffer)
+
+    def test_deflated(self):
+        with JarReader.open(self._mkjar('deflated.jar', zipfile.ZIP_DEFLATED)) as reader:
+            self._assert_entries(reader, DEFLATED)
+
+    def test_prefixed(self):
+        with JarReader.open(self._mkjar('prefixed.jmod', zipfile.ZIP_DEFLATED, prefix='JM\x01\x00')) as reader:
+            self._assert_entries(reader, DEFLATED)
+
+    def test_jmod(self):
+        path = os.path.join(self._tmpdir, 'java.sql.jmod')
+        zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        zf.writestr('classes/java/sql/Driver.class', self.contents['SimplePOJO.class'])
+        zf.writestr('classes/module-info.class', self.contents['Java8Sample.class'])
+        zf.writestr('legal/LICENSE', 'license')
+        zf.close()
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write('JM\x01\x00' + data)
+
+        with JarReader.open(path) as reader:
+            self.assertTrue(reader.jmod)
+            self.assertEquals([reader.resource_name(it) for it in reader], ['java/sql/Driver.class', 'module-info.class', None])
+            self.assertEquals(str(reader.read(reader.entries[0])), self.contents['SimplePOJO.class'])
+
+    def test_manifest(self):
+        attributes = parse_manifest('Manifest-Version: 1.0\r\nclass-path: a.jar \r\n  b.jar\r\nMulti-Release:true\r\n\r\nName: x\r\nSealed: true\r\n')
+        self.assertEquals(attributes, {'manifest-version': '1.0', 'class-path': 'a.jar  b.jar', 'multi-release': 'true'})
+
+        path = os.path.join(self._tmpdir, 'multi-release.jar')
+        zf = zipfile.ZipFile(path, 'w')
+        zf.writestr('META-INF/MANIFEST.MF', 'Manifest-Version: 1.0\nMulti-Release: TRUE\n')
+        zf.close()
+        with JarReader.open(path) as reader:
+            self.assertEquals(reader.find('META-INF/MANIFEST.MF'), reader.entries[0])
+            self.assertIsNone(reader.find('META-INF/INDEX.LIST'))
+            self.assertTrue(reader.multi_release)
+
+        with JarReader.open(self._mkjar('stored.jar', zipfile.ZIP_STORED)) as reader:
+            self.assertEquals(reader.manifest(), {})
+            self.assertFalse(reader.multi_release)
+
+    def test_in_memory(self):
+        with open(self._mkjar('memory.jar', zipfile.ZIP_STORED), 'rb') as f:
+            reader = JarReader(f.read())
+        self._assert_entries(reader, STORED)
+        self.assertFalse(reader.jmod)
+        self.assertEquals(reader.resource_name(reader.entries[1]), reader.entries[1].name)
+        
+    def test_copy(self):
+        with JarReader.open(self._mkjar('deflated.jar', zipfile.ZIP_DEFLATED)) as reader:
+            target = os.path.join(self._tmpdir, 'copy.class')
+            with open(target, 'wb') as f:
+                reader.copy(reader.entries[2], f)
+            with open(target, 'rb') as f:
+                self.assertEquals(f.read(), str(reader.read(reader.entries[2])))
+
+    def test_invalid(self):
+        path = os.path.join(self._tmpdir, 'invalid.jar')
+        with open(path, 'wb') as f:
+            f.write('not an archive')
+        self.assertRaises(AssertionError, JarReader.open, path)
+        
+        open(path, 'wb').close()
+        self.assertRaises(AssertionError, JarReader.open, path)
@@ -17,13 +17,38 @@
 #
 
 import os
+import struct
 import unittest
 
-from coffea.java.java_class import JavaClass 
+from coffea.java.java_class import JavaClass, ClassFormatError, ModuleInfo, _SIGNATURE_TOKEN, PARSE_CODE_SIZE, PARSE_DEPENDENCIES
 from coffea.java.tests import __file__ as test_directory
 
 data_dir = os.path.join(os.path.dirname(test_directory), 'data')
 
+def module_info_class(name='com.example', requires=['java.base'], exports=['com/example'], extra_tag=None):
+    """Builds a module-info class file (with a Dynamic constant and an optional leading constant with extra_tag)."""
+    constant_pool = []
+    def add(entry):
+        constant_pool.append(entry)
+        return len(constant_pool)
+    def utf8(value):
+        return add(struct.pack('>BH', 1, len(value)) + value)
+
+    if extra_tag is not None:
+        add(struct.pack('>BH', extra_tag, 0))
+    this_class = add(struct.pack('>BH', 7, utf8('module-info')))
+    module_index = add(struct.pack('>BH', 19, utf8(name)))
+    requires_indices = [add(struct.pack('>BH', 19, utf8(it))) for it in requires]
+    exports_indices = [add(struct.pack('>BH', 20, utf8(it))) for it in exports]
+    add(struct.pack('>BHH', 17, 0, add(struct.pack('>BHH', 12, utf8('value'), utf8('I')))))
+    attribute_name = utf8('Module')
+
+    attribute = struct.pack('>HHHH', module_index, 0, 0, len(requires)) + ''.join(struct.pack('>HHH', it, 0, 0) for it in requires_indices)
+    attribute += struct.pack('>H', len(exports)) + ''.join(struct.pack('>HHH', it, 0, 0) for it in exports_indices)
+    attribute += struct.pack('>HHH', 0, 0, 0)
+    return (struct.pack('>IHHH', 0xcafebabe, 0, 53, len(constant_pool) + 1) + ''.join(constant_pool) + 
+            struct.pack('>HHHHHHHH', 0x8000, this_class, 0, 0, 0, 0, 1, attribute_name) + struct.pack('>I', len(attribute)) + attribute)
+
 class TestJavaClass(unittest.TestCase):
 
     def setUp(self):
@@ -83,3 +108,95 @@ class TestJavaClass(unittest.TestCase):
                                                             'java.math', 
                                                             'java.util'])
 
+    def test_from_bytes(self):
+        with open(data_dir+os.sep+'SimplePOJO.class', 'rb') as f:
+            data = f.read()
+        for buf in [data, bytearray(data), memoryview(data)]:
+            obj = JavaClass.from_bytes(buf)
+            self.assertEquals(obj.name, self.obj.name)
+            self.assertEquals(obj.size, self.obj.size)
+            self.assertEquals(obj.constant_pool, self.obj.constant_pool)
+            self.assertEquals(obj.fields, self.obj.fields)
+            self.assertEquals(obj.methods, self.obj.methods)
+            self.assertEquals(obj.attributes, self.obj.attributes)
+            self.assertEquals(obj.class_dependencies(), self.obj.class_dependencies())
+
+    def test_constant_pool_wide_entries(self):
+        # Long/Double constants occupy their own index, followed by an unusable slot
+        self.assertEquals(self.obj.constant_pool[6].tag, 5)
+        self.assertIsNone(self.obj.constant_pool[7])
+        self.assertEquals(self.obj.constant_pool[10].tag, 6)
+        self.assertIsNone(self.obj.constant_pool[11])
+
+    def test_module_constants(self):
+        # Module, Package (Java 9) and Dynamic (Java 11) constants
+        obj = JavaClass.from_bytes(module_info_class())
+        self.assertEquals(obj.name, 'module-info')
+        self.assertEquals([it.tag for it in obj.constant_pool[1:]], [1, 7, 1, 19, 1, 19, 1, 20, 1, 1, 12, 17, 1])
+        self.assertEquals(obj.constant_pool[4].name_index, 3)
+        self.assertEquals(obj.constant_pool[12].name_and_type_index, 11)
+        self.assertEquals(obj.class_dependencies(), ['module-info'])
+
+    def test_module(self):
+        obj = JavaClass.from_bytes(module_info_class('com.example.app', ['java.base', 'java.sql'], ['com/example/api', 'com/example/spi']))
+        self.assertEquals(obj.module, ModuleInfo('com.example.app', ['java.base', 'java.sql'], ['com.example.api', 'com.example.spi']))
+        self.assertIsNone(self.obj.module)
+
+    def test_format_errors(self):
+        with self.assertRaises(ClassFormatError) as error:
+            JavaClass.from_bytes(module_info_class(extra_tag=21))
+        self.assertEquals(error.exception.offset, 10)
+
+        with self.assertRaises(ClassFormatError) as error:
+            JavaClass.from_bytes(module_info_class()[:20], mode=PARSE_DEPENDENCIES)
+        self.assertEquals(error.exception.offset, 20)
+
+        with self.assertRaises(ClassFormatError) as error:
+            JavaClass.from_bytes('\xca\xfe\xba\xbf' + module_info_class()[4:])
+        self.assertEquals(error.exception.offset, 0)
+
+    def test_parse_modes(self):
+        path = data_dir+os.sep+'SimplePOJO.class'
+        for mode in [PARSE_DEPENDENCIES, PARSE_CODE_SIZE]:
+            obj = JavaClass(path, mode=mode)
+            self.assertEquals(obj.name, self.obj.name)
+            self.assertEquals(obj.super_name, self.obj.super_name)
+            self.assertEquals(obj.interfaces, self.obj.interfaces)
+            self.assertEquals(obj.size, self.obj.size)
+            self.assertEquals(obj.class_dependencies(), self.obj.class_dependencies())
+            self.assertEquals(obj.package_dependencies(), self.obj.package_dependencies())
+            self.assertIsNone(obj.constant_pool)
+
+        self.assertEquals(JavaClass(path, mode=PARSE_CODE_SIZE).code_size, 426)
+        self.assertRaises(AssertionError, JavaClass, path, mode='unknown')
+
+    def test_lazy_members(self):
+        obj = JavaClass(data_dir+os.sep+'SimplePOJO.class', mode=PARSE_DEPENDENCIES)
+        self.assertIsNone(obj._field_offsets)
+        self.assertIsNone(obj._methods)
+        
+        self.assertEquals(obj.code_size, 426)
+        self.assertEquals(len(obj._method_offsets), len(self.obj.methods))
+        self.assertIsNone(obj._methods)
+
+        self.assertEquals(obj.fields, self.obj.fields)
+        self.assertEquals(obj.methods, self.obj.methods)
+        self.assertEquals(obj.attributes, self.obj.attributes)
+
+    def test_signature_parsing(self):
+        def classes(signature):
+            return [it.group(1) for it in _SIGNATURE_TOKEN.finditer(signature) if it.group(1)]
+
+        self.assertEquals(classes('(IJ[[Ljava/lang/Double;ZTT;)V'), ['java/lang/Double'])
+        self.assertEquals(classes('<T:Ljava/lang/Object;LT::Ljava/lang/Comparable<-TLT;>;>(TT;[TLabel;)V'), 
+                          ['java/lang/Object', 'java/lang/Comparable'])
+        self.assertEquals(classes('Ljava/util/Map<TK;*>.Listener<+Lcom/example/V;>;^Ljava/io/IOException;'), 
+                          ['java/util/Map', 'com/example/V', 'java/io/IOException'])
+
+    def test_member_dependencies(self):
+        members = self.obj.member_dependencies()
+        self.assertIn('SimplePOJO#matrix', members)
+        self.assertIn('java.lang.Integer#valueOf(I)Ljava/lang/Integer;', members)
+        self.assertIn('java.lang.Object#<init>()V', members)
+        self.assertIn('java.math.BigDecimal#ZERO', members)
+        self.assertEquals(members, JavaClass(data_dir+os.sep+'SimplePOJO.class', mode=PARSE_DEPENDENCIES).member_dependencies())
@@ -17,6 +17,8 @@
 #
 
 import os
+import struct
+import sys
 import unittest
 
 from coffea.java.java_class import JavaClass 
@@ -24,6 +26,31 @@ from coffea.java.tests import __file__ as test_directory
 
 data_dir = os.path.join(os.path.dirname(test_directory), 'data')
 
+def dependent_class(dependencies):
+    """Builds a class file referencing the specified number of classes (itself and java.lang.Object included)."""
+    constant_pool = []
+    def add(entry):
+        constant_pool.append(entry)
+        return len(constant_pool)
+    def class_ref(name):
+        return add(struct.pack('>BH', 7, add(struct.pack('>BH', 1, len(name)) + name)))
+
+    this_class = class_ref('com/example/Sample')
+    super_class = class_ref('java/lang/Object')
+    for index in xrange(dependencies - 2):
+        class_ref('com/example/dep/Dependency%d' % index)
+    return (struct.pack('>IHHH', 0xcafebabe, 0, 52, len(constant_pool) + 1) + ''.join(constant_pool) + 
+            struct.pack('>HHHHHHHH', 0x21, this_class, super_class, 0, 0, 0, 0, 0))
+
+def footprint(obj):
+    """Returns the size of a compact JavaClass with its containers (name strings excluded)."""
+    size = sys.getsizeof(obj)
+    for slot in JavaClass.__slots__:
+        value = getattr(obj, slot, None)
+        if value is not None and not isinstance(value, (int, long, str)):
+            size += sys.getsizeof(value)
+    return size
+
 class TestJavaClass(unittest.TestCase):
 
     def setUp(self):
@@ -84,3 +111,46 @@ class TestJavaClass(unittest.TestCase):
                                                             'java.util',
                                                             'java.util.stream'])
 
+    def test_descriptor_dependencies(self):
+        deps = self.obj.class_dependencies(sort=False)
+        self.assertIsInstance(deps, frozenset)
+        self.assertIs(self.obj.class_dependencies(sort=False), deps)
+        self.assertNotIn('java.time.LocalDateTime', deps)
+
+        all_deps = self.obj.class_dependencies(sort=False, descriptors=True)
+        self.assertTrue(all_deps.issuperset(deps))
+        self.assertEquals(sorted(all_deps - deps), ['java.lang.Class', 
+                                                    'java.lang.invoke.CallSite', 
+                                                    'java.lang.invoke.MethodHandle', 
+                                                    'java.lang.invoke.MethodType', 
+                                                    'java.time.LocalDateTime', 
+                                                    'java.util.function.Consumer', 
+                                                    'java.util.function.Function', 
+                                                    'java.util.function.Predicate'])
+        self.assertIn('java.time', self.obj.package_dependencies(descriptors=True))
+        self.assertIn('java.util.function', self.obj.package_dependencies(descriptors=True))
+        self.assertNotIn('java.time', self.obj.package_dependencies())
+
+    def test_release(self):
+        obj = JavaClass(data_dir+os.sep+'Java8Sample.class', compact=True)
+        self.assertIsNone(obj.constant_pool)
+        self.assertEquals(obj.name, 'Java8Sample')
+        self.assertEquals(obj.code_size, 320)
+        self.assertEquals(obj.class_dependencies(), self.obj.class_dependencies())
+        self.assertEquals(obj.package_dependencies(), self.obj.package_dependencies())
+        self.assertTrue(obj.public)
+        
+        self.assertRaises(AssertionError, getattr, obj, 'methods')
+        self.assertRaises(AssertionError, obj.class_dependencies, descriptors=True)
+        self.assertRaises(AttributeError, setattr, obj, 'undeclared', None)
+
+    def test_memory_footprint(self):
+        obj = JavaClass(data_dir+os.sep+'Java8Sample.class', compact=True)
+        self.assertEquals(len(obj.class_dependencies()), 13)
+        self.assertLess(footprint(obj), 1100)
+
+        # Documented figures: < 1.1 KB up to 15 dependencies, < 2.6 KB up to 63
+        for dependencies, limit in [(15, 1100), (63, 2600)]:
+            obj = JavaClass.from_bytes(dependent_class(dependencies), compact=True)
+            self.assertEquals(len(obj.class_dependencies()), dependencies)
+            self.assertLess(footprint(obj), limit)
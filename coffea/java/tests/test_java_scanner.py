@@ -16,14 +16,25 @@
 # limitations under the License.
 #
 
+import heapq
+import itertools
 import mock
 import os
 import shutil
+import tarfile
 import tempfile
+import time
 import unittest
 import zipfile
+import zlib
 
-from coffea.java.java_scanner import JavaScanner
+from StringIO import StringIO
+
+from coffea.java import java_scanner
+from coffea.java.jar_reader import JarReader
+from coffea.java.java_scanner import JavaScanner, PathFilter, entry_class_name, _ReadBuffer
+from coffea.java.tests.test_jimage_reader import write_jimage
+from coffea.quarantine import Quarantine
 
 class Archive(object):
 
@@ -163,6 +174,22 @@ class SampleEar(Archive):
 
 class TestJavaScanner(unittest.TestCase):
 
+    def _callback(self):
+        # Archive entry data is only valid during the call - keep a copy
+        callback = mock.MagicMock()
+        callback.entries = {}
+        callback.fingerprints = {}
+        def record(path, data=None, fingerprint=None):
+            if data is not None:
+                callback.entries[path] = str(data)
+                callback.fingerprints[path] = fingerprint
+        callback.side_effect = record
+        return callback
+
+    def _assert_any_entry(self, callback, path, data):
+        self.assertIn(path, callback.entries)
+        self.assertEquals(callback.entries[path], data)
+
     def setUp(self):
         self.scanner = JavaScanner(callback=mock.MagicMock())
         self.assertTrue(os.path.isdir(self.scanner._work_dir))
@@ -237,8 +264,558 @@ class TestJavaScanner(unittest.TestCase):
             self.assertEquals(scanner.scan(exploded_ear.root_path), 7)
             self.assertEquals(scanner.callback.call_count, 7)
     
+    def test_scan_file_data_callback(self):
+        with JavaScanner(data_callback=self._callback()) as scanner:
+            with tempfile.NamedTemporaryFile(suffix = '.class') as class_file:
+                self.assertEquals(scanner.scan(class_file.name), 1) 
+                scanner.data_callback.assert_any_call(class_file.name, None, None)
+
+            with SampleEar() as exploded_ear:
+                ear = exploded_ear.compress()
+                scanner.data_callback.reset_mock()
+                self.assertEquals(scanner.scan(ear), 7)
+                self.assertEquals(scanner.data_callback.call_count, 7)
+            self.assertIsNone(scanner._work_dir)
+
+    def test_scan_directory_data_callback(self):
+        with JavaScanner(data_callback=self._callback()) as scanner:
+            with SampleEar() as exploded_ear:
+                self.assertEquals(scanner.scan(exploded_ear.root_path), 7)
+                self.assertEquals(scanner.data_callback.call_count, 7)
+                self._assert_any_entry(scanner.data_callback, os.path.join(exploded_ear.lib_path, 'commons.jar') + '!/com/example/CommonClass.class', '')
+            self.assertIsNone(scanner._work_dir)
+    
     def test_with_contract(self):
         with JavaScanner(callback=mock.MagicMock()) as s:
             self.assertTrue(s)
-            self.assertTrue(os.path.isdir(s._work_dir))
-        self.assertFalse(os.path.isdir(s._work_dir))
+            work_dir = s.work_dir
+            self.assertTrue(os.path.isdir(work_dir))
+        self.assertFalse(os.path.isdir(work_dir))
+
+    def test_scan_in_memory(self):
+        with JavaScanner(data_callback=self._callback()) as scanner:
+            with SampleJar() as exploded_jar:
+                jar = exploded_jar.compress()
+                self.assertEquals(scanner.scan(jar), 2)
+                self._assert_any_entry(scanner.data_callback, jar + '!/com/example/Component.class', '')
+                self.assertIsNone(scanner._work_dir)
+            
+            with SampleWar() as exploded_war:
+                war = exploded_war.compress()
+                scanner.data_callback.reset_mock()
+                self.assertEquals(scanner.scan(war), 6)
+                self._assert_any_entry(scanner.data_callback, war + '!/WEB-INF/classes/Model.class', '')
+
+    def test_scan_extract(self):
+        with SampleWar() as exploded_war:
+            war = exploded_war.compress()
+            with JavaScanner(callback=mock.MagicMock(), extract=True) as scanner:
+                self.assertEquals(scanner.scan(war), 6)
+                self.assertEquals(scanner.callback.call_count, 6)
+                for args, kwargs in scanner.callback.call_args_list:
+                    self.assertEquals(len(args), 1)
+                    self.assertTrue(os.path.isfile(args[0]))
+
+    def test_scan_legacy_callback(self):
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            paths = []
+            def legacy(path):
+                self.assertTrue(os.path.isfile(path))
+                paths.append(path)
+
+            # A path callback gets class files - archives are extracted by default
+            with JavaScanner(legacy) as scanner:
+                self.assertTrue(scanner.extract)
+                self.assertEquals(scanner.scan(ear), 7)
+            self.assertEquals(len(paths), 7)
+
+            # Tar bundles included
+            bundle = self._mktar(os.path.join(exploded_ear._tmpdir, 'dist.tar.gz'), [('dist/app.ear', ear), ('../evil.class', 'E')])
+            del paths[:]
+            with JavaScanner(legacy) as scanner:
+                self.assertEquals(scanner.scan(bundle), 7)
+            self.assertEquals(len(paths), 7)
+
+            with JavaScanner(callback=mock.MagicMock(), extract=False) as scanner:
+                self.assertEquals(scanner.scan(ear), 7)
+                scanner.callback.assert_any_call(ear + '!/lib/commons.jar!/com/example/CommonClassFactory.class')
+
+            with JavaScanner(callback=mock.MagicMock(), data_callback=self._callback()) as scanner:
+                self.assertFalse(scanner.extract)
+                self.assertEquals(scanner.scan(ear), 7)
+                self.assertEquals(scanner.callback.call_count, 0)
+                self._assert_any_entry(scanner.data_callback, ear + '!/lib/commons.jar!/com/example/CommonClassFactory.class', '')
+
+    def test_scan_nested_in_memory(self):
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            with JavaScanner(data_callback=self._callback()) as scanner:
+                self.assertEquals(scanner.scan(ear), 7)
+                self._assert_any_entry(scanner.data_callback, ear + '!/lib/commons.jar!/com/example/CommonClassFactory.class', '')
+                self.assertIsNone(scanner._work_dir)
+
+    def test_scan_nested_spill(self):
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            with JavaScanner(data_callback=self._callback(), spill_threshold=0) as scanner:
+                self.assertEquals(scanner.scan(ear), 7)
+                self._assert_any_entry(scanner.data_callback, ear + '!/business-component.jar!/com/example/ServiceBean.class', '')
+                self.assertTrue(os.path.isdir(scanner._work_dir))
+                self.assertEquals(os.listdir(scanner._work_dir), [])
+
+    def test_scan_parallel(self):
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            expected = self._callback()
+            with JavaScanner(data_callback=expected) as scanner:
+                scanner.scan(ear)
+            
+            for ordered in [True, False]:
+                callback = self._callback()
+                with JavaScanner(data_callback=callback, workers=2, ordered=ordered) as scanner:
+                    self.assertEquals(scanner.scan(ear), 7)
+                    self.assertTrue(scanner._pool)
+                self.assertIsNone(scanner._pool)
+                self.assertEquals(callback.entries, expected.entries)
+                if ordered:
+                    self.assertEquals(callback.call_args_list, expected.call_args_list)
+
+    def test_scan_parallel_stopped_early(self):
+        with Archive('lib') as lib:
+            jar = self._mkzip(os.path.join(lib.root_path, 'large.jar'), [('com/example/C%d.class' % it, 'C' * 10000) for it in xrange(64)])
+            read_entry = JavaScanner._read_entry
+            closed_reads = []
+            def checked_read_entry(scanner, archive, entry, origin):
+                if archive._data is None:
+                    closed_reads.append(entry.name)
+                return read_entry(scanner, archive, entry, origin)
+
+            def fail(*args):
+                raise ValueError('Callback failed')
+
+            with mock.patch.object(JavaScanner, '_read_entry', checked_read_entry):
+                for ordered in [True, False]:
+                    with JavaScanner(workers=4, ordered=ordered) as scanner:
+                        classes = scanner.iter_classes(jar)
+                        next(classes)
+                        classes.close()
+                    with JavaScanner(data_callback=mock.MagicMock(side_effect=fail), workers=4, ordered=ordered) as scanner:
+                        self.assertRaises(ValueError, scanner.scan, jar)
+            # Jobs were waited for before the archive was closed
+            self.assertEquals(closed_reads, [])
+
+    def test_duplicate_archives(self):
+        with Archive('libs') as libs:
+            libs.mkzip(libs.root_path, 'commons.jar', ['com/example/A.class'])
+            os.makedirs(os.path.join(libs.root_path, 'v2'))
+            libs.mkzip(os.path.join(libs.root_path, 'v2'), 'commons.jar', ['com/example/A.class', 'com/example/B.class'])
+            shutil.copy(os.path.join(libs.root_path, 'commons.jar'), os.path.join(libs.root_path, 'commons-copy.jar'))
+
+            for extract in [False, True]:
+                with JavaScanner(data_callback=self._callback(), extract=extract) as scanner:
+                    self.assertEquals(scanner.scan(libs.root_path), 3)
+                    self.assertEquals(len(scanner.duplicates), 1)
+                    duplicate, original = scanner.duplicates[0]
+                    self.assertEquals(sorted([os.path.basename(duplicate), os.path.basename(original)]), 
+                                      ['commons-copy.jar', 'commons.jar'])
+
+    def test_entry_fingerprints(self):
+        with Archive('libs') as libs:
+            libs.mkzip(libs.root_path, 'commons.jar', ['com/example/A.class'])
+            libs.mkzip(libs.root_path, 'commons-shaded.jar', ['com/example/A.class', 'com/example/B.class'])
+
+            with JavaScanner(data_callback=self._callback()) as scanner:
+                self.assertEquals(scanner.scan(libs.root_path), 3)
+                fingerprints = scanner.data_callback.fingerprints
+
+            a1 = fingerprints[os.path.join(libs.root_path, 'commons.jar') + '!/com/example/A.class']
+            a2 = fingerprints[os.path.join(libs.root_path, 'commons-shaded.jar') + '!/com/example/A.class']
+            b = fingerprints[os.path.join(libs.root_path, 'commons-shaded.jar') + '!/com/example/B.class']
+            self.assertEquals(a1, a2)
+            self.assertNotEquals(a1, b)
+
+    def _mkzip(self, path, entries):
+        zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        for name, path_or_data in entries:
+            if os.path.isfile(path_or_data):
+                zf.write(path_or_data, name)
+            else:
+                zf.writestr(name, path_or_data)
+        zf.close()
+        return path
+
+    def _mktar(self, path, entries, mode='w:gz'):
+        tf = tarfile.open(path, mode)
+        for name, path_or_data in entries:
+            if os.path.isfile(path_or_data):
+                tf.add(path_or_data, name)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(path_or_data)
+                tf.addfile(info, StringIO(path_or_data))
+        tf.close()
+        return path
+
+    def test_scan_bundles(self):
+        with Archive('dist') as dist:
+            a = self._mkzip(os.path.join(dist._tmpdir, 'a.jar'), [('com/example/A.class', 'A')])
+            b = self._mkzip(os.path.join(dist._tmpdir, 'b.jar'), [('com/example/B.class', 'B')])
+            inner = self._mktar(os.path.join(dist._tmpdir, 'inner.tar'), [('lib/b.jar', b)], mode='w')
+            bundle = self._mktar(os.path.join(dist.root_path, 'app.tar.gz'), 
+                                 [('./app/lib/a.jar', a), ('app/inner.tar', inner), ('app/classes/com/example/C.class', 'C'), 
+                                  ('app/README', 'text'), ('app/lib/broken.jar', 'not an archive')])
+            self._mkzip(os.path.join(dist.root_path, 'app.zip'), [('lib/a.jar', a), ('classes/com/example/D.class', 'D')])
+
+            for workers, ordered in [(0, True), (2, True), (2, False)]:
+                for spill_threshold in [0, 1024 * 1024]:
+                    quarantine = Quarantine()
+                    with JavaScanner(workers=workers, ordered=ordered, spill_threshold=spill_threshold, quarantine=quarantine) as scanner:
+                        records = dict((it.origin, (str(it.data), it.fingerprint)) for it in scanner.iter_classes(dist.root_path))
+                        if spill_threshold > 0:
+                            self.assertIsNone(scanner._work_dir)
+                        else:
+                            self.assertEquals(os.listdir(scanner._work_dir), [])
+                    # Identical jars in both bundles - whichever comes first is read
+                    self.assertEquals(len(scanner.duplicates), 1)
+                    self.assertEquals(sorted(data for data, fingerprint in records.values()), ['A', 'B', 'C', 'D'])
+                    self.assertIn(bundle + '!/app/inner.tar!/lib/b.jar!/com/example/B.class', records)
+                    self.assertIn(os.path.join(dist.root_path, 'app.zip!/classes/com/example/D.class'), records)
+                    self.assertEquals(records[bundle + '!/app/classes/com/example/C.class'], ('C', ('app/classes/com/example/C.class', zlib.crc32('C') & 0xffffffff, 1)))
+                    self.assertEquals([it.origin for it in quarantine], [bundle + '!/app/lib/broken.jar'])
+
+            with JavaScanner(quarantine=Quarantine()) as scanner:
+                self.assertEquals([it[0] for it in scanner.iter_archives(bundle)], [bundle + '!/app/lib/a.jar', bundle + '!/app/inner.tar!/lib/b.jar'])
+            with JavaScanner() as scanner:
+                self.assertRaises(AssertionError, list, scanner.iter_classes(bundle))
+
+            with JavaScanner(path_filter=PathFilter(exclude=['*inner.tar', '*broken.jar'])) as scanner:
+                self.assertEquals(len([it for it in scanner.iter_classes(bundle) if it.data]), 2)
+
+    def test_scan_truncated_bundle(self):
+        with Archive('dist') as dist:
+            bundle = self._mktar(os.path.join(dist.root_path, 'app.tar.gz'), [('A.class', 'A'), ('B.class', os.urandom(100000).replace('\0', 'B'))])
+            with open(bundle, 'r+b') as f:
+                f.truncate(os.path.getsize(bundle) // 2)
+            for workers, ordered in [(0, True), (2, False)]:
+                quarantine = Quarantine()
+                with JavaScanner(workers=workers, ordered=ordered, quarantine=quarantine) as scanner:
+                    self.assertEquals([str(it.data) for it in scanner.iter_classes(dist.root_path)], ['A'])
+                self.assertEquals([it.origin for it in quarantine], [bundle])
+
+    def test_origin_chain(self):
+        with Archive('app') as app:
+            jar = self._mkzip(os.path.join(app._tmpdir, 'x.jar'), [('a/B.class', 'B')])
+            war = self._mkzip(os.path.join(app._tmpdir, 'web.war'), [('WEB-INF/classes/a/C.class', 'C'), ('WEB-INF/lib/x.jar', jar)])
+            ear = self._mkzip(os.path.join(app.root_path, 'app.ear'), [('web.war', war), ('lib/x.jar', jar)])
+
+            for spill_threshold in [0, 1024 * 1024]:
+                with JavaScanner(data_callback=self._callback(), spill_threshold=spill_threshold) as scanner:
+                    self.assertEquals(scanner.scan(app.root_path), 2)
+                    self.assertEquals(sorted(scanner.data_callback.entries.items()), 
+                                      [(ear + '!/web.war!/WEB-INF/classes/a/C.class', 'C'),
+                                       (ear + '!/web.war!/WEB-INF/lib/x.jar!/a/B.class', 'B')])
+                    self.assertEquals(scanner.duplicates, [(ear + '!/lib/x.jar', ear + '!/web.war!/WEB-INF/lib/x.jar')])
+
+    def test_walk_stopped_early(self):
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            with JavaScanner(callback=None, spill_threshold=0) as scanner:
+                classes = scanner.iter_classes(ear)
+                record = next(classes)
+                self.assertTrue(record.origin.startswith(ear + '!/'))
+                classes.close()
+                self.assertEquals(os.listdir(scanner.work_dir), [])
+
+    def test_scan_directory_symlinks(self):
+        with SampleJar() as exploded_jar:
+            os.symlink(exploded_jar.com_path, os.path.join(exploded_jar.root_path, 'com-link'))
+            os.symlink(os.path.join(exploded_jar.com_example_path, 'Component.class'), 
+                       os.path.join(exploded_jar.root_path, 'Linked.class'))
+            self.assertEquals(self.scanner.scan(exploded_jar.root_path), 3)
+
+    def test_scan_directory_unlistable(self):
+        with SampleJar() as exploded_jar:
+            exploded_jar.mkfile(exploded_jar.root_path, 'Root.class')
+            scandir = java_scanner.scandir
+
+            def failing_scandir(path):
+                if path == exploded_jar.com_example_path:
+                    raise OSError(13, 'Permission denied', path)
+                return scandir(path)
+
+            with mock.patch.object(java_scanner, 'scandir', side_effect=failing_scandir):
+                self.assertEquals(self.scanner.scan(exploded_jar.root_path), 1)
+
+                quarantine = Quarantine()
+                with JavaScanner(quarantine=quarantine) as scanner:
+                    self.assertEquals(len(list(scanner.iter_classes(exploded_jar.root_path))), 1)
+                self.assertEquals([it.origin for it in quarantine], [exploded_jar.com_example_path])
+
+    def test_path_filter(self):
+        path_filter = PathFilter()
+        self.assertTrue(path_filter.accept_dir('/libs/test'))
+        self.assertTrue(path_filter.accept_archive('/libs/a-sources.jar'))
+        self.assertTrue(path_filter.accept_class('/libs/a.jar!/A.class'))
+
+        path_filter = PathFilter(include=['*/com/example/*'], exclude=['*/test', '*-sources.jar', '*.war!/WEB-INF/lib/*'])
+        self.assertFalse(path_filter.accept_dir('/libs/test'))
+        self.assertTrue(path_filter.accept_dir('/libs/tests'))
+        self.assertFalse(PathFilter(exclude=['*/test/*']).accept_dir('/libs/test'))
+        self.assertFalse(path_filter.accept_archive('/libs/a-sources.jar'))
+        self.assertFalse(path_filter.accept_archive('/libs/a.ear!/b.war!/WEB-INF/lib/c.jar'))
+        self.assertTrue(path_filter.accept_archive('/libs/a.ear!/lib/c.jar'))
+        self.assertTrue(path_filter.accept_class('/libs/a.jar!/com/example/A.class'))
+        self.assertFalse(path_filter.accept_class('/libs/a.jar!/org/example/A.class'))
+        self.assertFalse(path_filter.accept_class('/libs/a.ear!/b.war!/WEB-INF/lib/c.jar!/com/example/A.class'))
+
+    def test_scan_path_filter(self):
+        with SampleWar() as exploded_war:
+            path_filter = PathFilter(exclude=['*/WEB-INF/classes', '*/service-api.jar'])
+            with JavaScanner(data_callback=self._callback(), path_filter=path_filter) as scanner:
+                self.assertEquals(scanner.scan(exploded_war.root_path), 2)
+                self.assertEquals(scanner.pruned, 2)
+                self.assertEquals(sorted(it.rpartition('!/')[2] for it in scanner.data_callback.entries), 
+                                  ['com/example/ServiceImpl.class', 'com/example/ServiceImplHelper.class'])
+
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            path_filter = PathFilter(include=['*Helper.class'], exclude=['*!/lib/*'])
+            for workers in [0, 2]:
+                with JavaScanner(data_callback=self._callback(), path_filter=path_filter, workers=workers) as scanner:
+                    self.assertEquals(scanner.scan(ear), 1)
+                    self.assertEquals(scanner.data_callback.entries.keys(), [ear + '!/sample-webapp.war!/com/example/CommonClassHelper.class'])
+
+    def test_entry_class_name(self):
+        self.assertEquals(entry_class_name('com/example/A.class'), 'com.example.A')
+        self.assertEquals(entry_class_name('A$1.class'), 'A$1')
+        self.assertEquals(entry_class_name('WEB-INF/classes/com/example/A.class'), 'com.example.A')
+        self.assertEquals(entry_class_name('BOOT-INF/classes/com/example/A.class'), 'com.example.A')
+        self.assertEquals(entry_class_name('META-INF/versions/11/com/example/A.class'), 'com.example.A')
+        self.assertIsNone(entry_class_name('META-INF/example/A.class'))
+        self.assertEquals(entry_class_name('WEB-INF/classes/com/example/A.class', False), 'com.example.A')
+        self.assertIsNone(entry_class_name('APP-INF/classes/com/example/A.class', False))
+
+    def test_scan_class_filter(self):
+        with SampleWar() as exploded_war:
+            war = exploded_war.compress()
+            class_filter = lambda class_name: class_name != 'Model' and not class_name.endswith('Helper')
+            for workers in [0, 2]:
+                with JavaScanner(data_callback=self._callback(), class_filter=class_filter, workers=workers) as scanner:
+                    self.assertEquals(scanner.scan(war), 4)
+                    self.assertEquals(scanner.rejected, 2)
+                    self.assertNotIn(war + '!/WEB-INF/classes/Model.class', scanner.data_callback.entries)
+
+            with JavaScanner(data_callback=self._callback(), class_filter=class_filter) as scanner:
+                # Class names of loose files are not known - only ServiceImplHelper (from service.jar) is rejected
+                self.assertEquals(scanner.scan(exploded_war.root_path), 5)
+                self.assertEquals(scanner.rejected, 1)
+
+    def test_scan_jdk(self):
+        with Archive('jdk') as jdk:
+            lib_path = jdk.mkdir(jdk.root_path, 'lib')
+            jmods_path = jdk.mkdir(jdk.root_path, 'jmods')
+            image = write_jimage(os.path.join(lib_path, 'modules'), [('/java.base/java/lang/Object.class', 'Object'),
+                                                                     ('/java.base/java/lang/Helper.class', 'Helper'),
+                                                                     ('/java.base/module-info.class', 'module-info'),
+                                                                     ('/java.base/java/lang/Object.properties', ''),
+                                                                     ('/packages/java.lang/java.base', '')])
+            jmod = jdk.mkzip(jmods_path, 'java.sql.jmod', ['classes/java/sql/Driver.class', 'classes/java/sql/DriverHelper.class',
+                                                           'legal/LICENSE'])
+            with open(jmod, 'rb') as f:
+                data = f.read()
+            with open(jmod, 'wb') as f:
+                f.write('JM\x01\x00' + data)
+
+            class_filter = lambda class_name: not class_name.endswith('Helper')
+            with JavaScanner(data_callback=self._callback(), class_filter=class_filter) as scanner:
+                self.assertTrue(scanner.supported_file(image))
+                self.assertTrue(scanner.supported_file(jmod))
+                self.assertEquals(scanner.scan(jdk.root_path), 3)
+                self.assertEquals(scanner.rejected, 2)
+                self._assert_any_entry(scanner.data_callback, image + '!/java.base/java/lang/Object.class', 'Object')
+                self.assertIsNone(scanner.data_callback.fingerprints[image + '!/java.base/java/lang/Object.class'])
+                self.assertIn(image + '!/java.base/module-info.class', scanner.data_callback.entries)
+                self.assertIn(jmod + '!/classes/java/sql/Driver.class', scanner.data_callback.entries)
+
+    def test_scan_multi_release(self):
+        with Archive('lib') as lib:
+            entries = [('META-INF/MANIFEST.MF', 'Manifest-Version: 1.0\nMulti-Release: true\n'),
+                       ('com/example/A.class', 'A'), ('com/example/B.class', 'B'),
+                       ('META-INF/versions/9/com/example/A.class', 'A9'),
+                       ('META-INF/versions/11/com/example/A.class', 'A11'),
+                       ('META-INF/versions/11/com/example/C.class', 'C11'),
+                       ('META-INF/versions/21/com/example/B.class', 'B21')]
+            jar = os.path.join(lib.root_path, 'multi-release.jar')
+            zf = zipfile.ZipFile(jar, 'w')
+            for name, content in entries:
+                zf.writestr(name, content)
+            zf.close()
+
+            for release, expected in [(None, ['A', 'B']), (8, ['A', 'B']), (10, ['A9', 'B']), (17, ['A11', 'B', 'C11']), (21, ['A11', 'B21', 'C11'])]:
+                for workers in [0, 2]:
+                    with JavaScanner(data_callback=self._callback(), workers=workers, release=release) as scanner:
+                        self.assertEquals(scanner.scan(jar), len(expected))
+                        self.assertEquals(sorted(scanner.data_callback.entries.values()), expected)
+                        self.assertEquals(scanner.superseded, 6 - len(expected))
+                with JavaScanner(release=release, workers=1, ordered=False) as scanner:
+                    self.assertEquals(sorted(str(it.data) for it in scanner.iter_classes(jar)), expected)
+
+            # Not a multi-release jar - versioned entries are plain entries
+            zf = zipfile.ZipFile(jar, 'w')
+            for name, content in entries[1:]:
+                zf.writestr(name, content)
+            zf.close()
+            with JavaScanner(data_callback=self._callback()) as scanner:
+                self.assertEquals(scanner.scan(jar), 6)
+                self.assertEquals(scanner.superseded, 0)
+
+    def test_scan_quarantine(self):
+        with Archive('lib') as lib:
+            good = os.path.join(lib.root_path, 'good.jar')
+            self._mkzip(good, [('com/example/A.class', 'A'), ('com/example/B.class', 'B')])
+            broken = os.path.join(lib.root_path, 'broken.jar')
+            with open(broken, 'wb') as f:
+                f.write('not an archive')
+
+            outer = os.path.join(lib.root_path, 'outer.jar')
+            zf = zipfile.ZipFile(outer, 'w', zipfile.ZIP_DEFLATED)
+            zf.writestr('inner.jar', 'not an archive either')
+            zf.writestr('com/example/Bad.class', 'B' * 100)
+            zf.writestr('com/example/C.class', 'C')
+            zf.close()
+            # Corrupt the deflated data of Bad.class
+            bad = zipfile.ZipFile(outer).getinfo('com/example/Bad.class')
+            with open(outer, 'r+b') as f:
+                f.seek(bad.header_offset + 30 + len(bad.filename))
+                f.write('\xff' * bad.compress_size)
+            inner_offset = zipfile.ZipFile(outer).getinfo('inner.jar').header_offset
+
+            for workers, ordered in [(0, True), (2, True), (2, False)]:
+                quarantine = Quarantine()
+                with JavaScanner(workers=workers, ordered=ordered, quarantine=quarantine) as scanner:
+                    self.assertEquals(sorted(str(it.data) for it in scanner.iter_classes(lib.root_path)), ['A', 'B', 'C'])
+                self.assertEquals(sorted((it.origin, it.offset) for it in quarantine), 
+                                  [(broken, None), (outer + '!/com/example/Bad.class', bad.header_offset), (outer + '!/inner.jar', inner_offset)])
+                self.assertTrue(all(it.reason.startswith(('AssertionError', 'error')) for it in quarantine))
+
+                with JavaScanner(workers=workers, ordered=ordered) as scanner:
+                    self.assertRaises(Exception, list, scanner.iter_classes(lib.root_path))
+
+    def test_iter_classes(self):
+        with SampleWar() as exploded_war:
+            with JavaScanner() as scanner:
+                records = dict((it.name, it) for it in scanner.iter_classes(exploded_war.root_path))
+            self.assertEquals(len(records), 6)
+
+            record = records[os.path.join('WEB-INF', 'classes', 'Model.class')]
+            self.assertEquals(record.origin, os.path.join(exploded_war.classes_path, 'Model.class'))
+            self.assertIsNone(record.data)
+            self.assertEquals(record.read(), '')
+
+            record = records['com/example/Service.class']
+            self.assertEquals(record.origin, os.path.join(exploded_war.lib_path, 'service-api.jar') + '!/com/example/Service.class')
+            self.assertEquals(record.size, 0)
+            self.assertEquals(record.fingerprint, ('com/example/Service.class', 0, 0))
+
+            with JavaScanner(spill_threshold=0) as scanner:
+                # Stop early, keeping a copy of the first archive entry
+                for record in scanner.iter_classes(exploded_war.compress()):
+                    if record.data is not None:
+                        data = record.read()
+                        break
+            self.assertEquals(data, '')
+
+    def test_read_files(self):
+        with Archive('classes') as classes:
+            contents = {'A.class': 'A', 'B.class': 'B' * 100, 'Large.class': 'L' * 100000, 'Empty.class': ''}
+            for name, data in contents.items():
+                with open(os.path.join(classes.root_path, name), 'wb') as f:
+                    f.write(data)
+            self._mkzip(os.path.join(classes.root_path, 'lib.jar'), [('com/example/C.class', 'C')])
+            contents['com/example/C.class'] = 'C'
+
+            for workers, ordered in [(0, True), (2, False)]:
+                with JavaScanner(workers=workers, ordered=ordered, read_files=True) as scanner:
+                    # Copies taken as records come - the read buffer is reused
+                    records = [(it.name, it.size, str(it.data), it.read()) for it in scanner.iter_classes(classes.root_path)]
+                self.assertEquals(sorted(records), sorted((name, len(data), data, data) for name, data in contents.items()))
+
+                callback = self._callback()
+                with JavaScanner(data_callback=callback, workers=workers, ordered=ordered, read_files=True) as scanner:
+                    scanner.scan(classes.root_path)
+                self._assert_any_entry(callback, os.path.join(classes.root_path, 'A.class'), 'A')
+
+                quarantine = Quarantine()
+                with mock.patch.object(_ReadBuffer, 'read', side_effect=IOError('Permission denied')):
+                    with JavaScanner(workers=workers, ordered=ordered, read_files=True, quarantine=quarantine) as scanner:
+                        self.assertEquals([it.name for it in scanner.iter_classes(classes.root_path)], ['com/example/C.class'])
+                self.assertEquals(len(quarantine), 4)
+
+    def test_read_buffer(self):
+        with Archive('classes') as classes:
+            paths = []
+            for index, size in enumerate([10, 20, 5000, 3]):
+                paths.append(os.path.join(classes.root_path, '%d.class' % index))
+                with open(paths[-1], 'wb') as f:
+                    f.write(chr(ord('a') + index) * size)
+
+            read_buffer = _ReadBuffer(16)
+            self.assertEquals(str(read_buffer.read(paths[0])), 'a' * 10)
+            self.assertEquals(str(read_buffer.read(paths[1])), 'b' * 20)
+            # Grown by doubling, then reused for smaller files
+            self.assertEquals(str(read_buffer.read(paths[2])), 'c' * 5000)
+            self.assertEquals(len(read_buffer._data), 8192)
+            self.assertEquals(str(read_buffer.read(paths[3])), 'ddd')
+            self.assertEquals(len(read_buffer._data), 8192)
+            self.assertRaises(IOError, read_buffer.read, os.path.join(classes.root_path, 'missing.class'))
+
+    def test_scan_scheduled(self):
+        with SampleEar() as exploded_ear:
+            ear = exploded_ear.compress()
+            for target in [exploded_ear.root_path, ear]:
+                expected = self._callback()
+                with JavaScanner(data_callback=expected) as scanner:
+                    scanner.scan(target)
+
+                for spill_threshold in [0, 1024 * 1024]:
+                    callback = self._callback()
+                    with JavaScanner(data_callback=callback, workers=2, ordered=False, spill_threshold=spill_threshold) as scanner:
+                        self.assertEquals(scanner.scan(target), 7)
+                        if scanner._work_dir is not None:
+                            self.assertEquals(os.listdir(scanner._work_dir), [])
+                    self.assertEquals(callback.entries, expected.entries)
+
+            # Nested archives opened by tasks still running when the scan stops are cleaned up too
+            open_nested_jar = JavaScanner._open_nested_jar
+            def slow_open_nested_jar(scanner, archive, entry, origin):
+                time.sleep(0.05)
+                return open_nested_jar(scanner, archive, entry, origin)
+            with mock.patch.object(JavaScanner, '_open_nested_jar', slow_open_nested_jar):
+                with JavaScanner(workers=2, ordered=False, spill_threshold=0) as scanner:
+                    classes = scanner.iter_classes(ear)
+                    self.assertTrue(next(classes).origin.startswith(ear + '!/'))
+                    classes.close()
+                    self.assertEquals(os.listdir(scanner.work_dir), [])
+
+    def test_schedule_largest_first(self):
+        with Archive('libs') as libs:
+            small = self._mkzip(os.path.join(libs.root_path, 'small.jar'), [('a/A.class', 'A' * 10)])
+            large = self._mkzip(os.path.join(libs.root_path, 'large.jar'), 
+                                [('b/B%d.class' % i, 'B' * 1000) for i in range(5)] + [('lib/small.jar', small)])
+
+            with mock.patch('coffea.java.java_scanner._CHUNK_COST', 3000):
+                with JavaScanner(workers=1, ordered=False) as scanner:
+                    origins = [it.origin for it in scanner.iter_classes(libs.root_path)]
+
+                    heap = []
+                    with JarReader.open(large) as archive:
+                        scanner._schedule(heap, itertools.count(), mock.MagicMock(reader=archive), large)
+
+            # Two chunks of two entries, one of a single entry and the nested archive
+            tasks = [heapq.heappop(heap)[2] for i in range(len(heap))]
+            self.assertEquals([len(entries) for action, source, entries, origin in tasks[:3]], [2, 2, 1])
+            self.assertEquals(tasks[3][2].name, 'lib/small.jar')
+            # One worker runs the tasks in schedule order
+            self.assertEquals([it.rpartition('!/')[2] for it in origins], ['b/B0.class', 'b/B1.class', 'b/B2.class', 'b/B3.class', 'b/B4.class', 'a/A.class'])
+            self.assertEquals(len(scanner.duplicates), 1)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from coffea.java.jar_reader import STORED, DEFLATED
+from coffea.java.jimage_reader import JImageReader, jimage_hash
+from coffea.java.tests import __file__ as test_directory
+
+data_dir = os.path.join(os.path.dirname(test_directory), 'data')
+
+def write_jimage(path, resources, order='<', compress=False):
+    """Writes a minimal jimage container with resources given as (/module/path, content) pairs."""
+    strings = bytearray('\0')
+    string_offsets = {'': 0}
+    def string(value):
+        if value not in string_offsets:
+            string_offsets[value] = len(strings)
+            strings.extend(value + '\0')
+        return string_offsets[value]
+
+    locations = bytearray()
+    location_offsets = []
+    content = bytearray()
+    for name, data in resources:
+        module, _, path_name = name[1:].partition('/')
+        parent, _, base = path_name.rpartition('/')
+        base, _, extension = base.rpartition('.') if '.' in base else (base, '', '')
+        file_size = len(data)
+        compressed_size = 0
+        if compress:
+            payload = zlib.compress(data)
+            data = struct.pack(order + 'IQQIIB', 0xCAFEFAFA, len(payload), len(data), string('zip'), 0, 1) + payload
+            compressed_size = len(data)
+        attributes = [(1, string(module)), (2, string(parent)), (3, string(base)), (4, string(extension)),
+                      (5, len(content)), (6, compressed_size), (7, file_size)]
+        content.extend(data)
+
+        location_offsets.append(len(locations))
+        for kind, value in attributes:
+            if value == 0:
+                continue
+            value_bytes = bytearray()
+            while value:
+                value_bytes.insert(0, value & 0xff)
+                value >>= 8
+            locations.append((kind << 3) | (len(value_bytes) - 1))
+            locations.extend(value_bytes)
+        locations.append(0)
+
+    # Perfect hash: buckets with collisions get a seed, single entries a direct slot
+    count = len(resources)
+    buckets = {}
+    for index, (name, data) in enumerate(resources):
+        buckets.setdefault(jimage_hash(name) % count, []).append(index)
+    redirect = [0] * count
+    slots = [None] * count
+    for bucket, indices in sorted(buckets.items(), key=lambda it: -len(it[1])):
+        if len(indices) > 1:
+            seed = 1
+            while True:
+                positions = [jimage_hash(resources[it][0], seed) % count for it in indices]
+                if len(set(positions)) == len(positions) and all(slots[it] is None for it in positions):
+                    break
+                seed += 1
+                assert seed < 0x10000, 'No perfect hash seed found, try another number of resources'
+            for index, position in zip(indices, positions):
+                slots[position] = index
+            redirect[bucket] = seed
+        else:
+            position = slots.index(None)
+            slots[position] = indices[0]
+            redirect[bucket] = -1 - position
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack(order + 'IIIIIII', 0xCAFEDADA, 1 << 16, 0, count, count, len(locations), len(strings)))
+        f.write(struct.pack(order + '%di' % count, *redirect))
+        f.write(struct.pack(order + '%dI' % count, *[location_offsets[it] for it in slots]))
+        f.write(locations)
+        f.write(strings)
+        f.write(content)
+    return path
+
+class TestJImageReader(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        with open(os.path.join(data_dir, 'SimplePOJO.class'), 'rb') as f:
+            self.class_data = f.read()
+        self.resources = [('/java.base/java/lang/Object.class', 'Object'),
+                          ('/java.base/java/lang/String.class', 'String'),
+                          ('/java.base/module-info.class', 'module-info'),
+                          ('/java.sql/java/sql/Driver.class', self.class_data),
+                          ('/java.sql/META-INF/services/java.sql.Driver', 'services'),
+                          ('/packages/java.lang/java.base', '')]
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _assert_image(self, reader):
+        self.assertEquals(len(reader), len(self.resources))
+        entries = dict((it.name, it) for it in reader)
+        self.assertEquals(sorted(entries), sorted(it[0][1:] for it in self.resources))
+
+        for name, data in self.resources:
+            entry = entries[name[1:]]
+            self.assertEquals(str(reader.read(entry)), data)
+            self.assertEquals(entry.file_size, len(data))
+            self.assertEquals(reader.find(name[1:]), entry)
+
+        entry = entries['java.sql/java/sql/Driver.class']
+        self.assertEquals(entry.module, 'java.sql')
+        self.assertEquals(reader.resource_name(entry), 'java/sql/Driver.class')
+        self.assertIsNone(entry.crc)
+        self.assertIsNone(reader.find('java.base/java/lang/Missing.class'))
+
+    def test_read(self):
+        for order in '<>':
+            path = write_jimage(os.path.join(self._tmpdir, 'modules'), self.resources, order)
+            self.assertTrue(JImageReader.is_jimage(path))
+            with JImageReader.open(path) as reader:
+                self._assert_image(reader)
+                self.assertTrue(all(it.method == STORED for it in reader))
+                self.assertIsInstance(reader.read(reader.entries[0]), buffer)
+
+    def test_compressed(self):
+        path = write_jimage(os.path.join(self._tmpdir, 'modules'), self.resources, compress=True)
+        with JImageReader.open(path) as reader:
+            self._assert_image(reader)
+            self.assertTrue(all(it.method == DEFLATED for it in reader))
+
+    def test_fingerprint(self):
+        first = write_jimage(os.path.join(self._tmpdir, 'first'), self.resources)
+        second = write_jimage(os.path.join(self._tmpdir, 'second'), self.resources)
+        other = write_jimage(os.path.join(self._tmpdir, 'other'), self.resources[1:])
+        with JImageReader.open(first) as a, JImageReader.open(second) as b, JImageReader.open(other) as c:
+            self.assertEquals(a.fingerprint(), b.fingerprint())
+            self.assertNotEquals(a.fingerprint(), c.fingerprint())
+
+    def test_invalid(self):
+        path = os.path.join(self._tmpdir, 'modules')
+        with open(path, 'wb') as f:
+            f.write('\xca\xfe\xba\xbe' + '\0' * 64)
+        self.assertFalse(JImageReader.is_jimage(path))
+        self.assertRaises(AssertionError, JImageReader.open, path)
+
+        open(path, 'wb').close()
+        self.assertFalse(JImageReader.is_jimage(path))
+        self.assertRaises(AssertionError, JImageReader.open, path)
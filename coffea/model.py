@@ -17,9 +17,14 @@
 #
 
 import abc
+import itertools
 import logging
 import threading
 
+from array import array
+
+from symbols import symbols
+
 log = logging.getLogger('model')
 
 class Model(object):
@@ -33,16 +38,47 @@ class Model(object):
         self.nodes = []
         self.node_filters = []
             
-    def merge(self, node):
-        """Merges provided Node into the underlying graph."""
-    
+    def __len__(self):
+        """Returns the number of nodes."""
+        return len(self.nodes)
+
+    def _filter(self, node):
+        """Passes a Node through the filter chain. Returns None, if it was rejected."""
         for nf in self.node_filters:
             assert isinstance(nf, NodeFilter), 'Node filter expected. Got: %s' % type(nf)
             node = nf(node)
             if node == None:
                 log.debug('Node rejected by: %s', nf)
-                return            
+                return None
             assert isinstance(node, Node), 'Node expected. Got: %s' % type(node)
+        return node
+
+    def accepts(self, node_id):
+        """Checks if a node with the specified id can pass the filter chain. 
+
+        Only filters looking at the node id alone are evaluated (mappers included, in chain 
+        order), so False means that merge() would reject the node for sure. Rejections are 
+        counted by the filters as usual."""
+        for nf in self.node_filters:
+            node_id = nf.filter_id(node_id)
+            if node_id is NotImplemented:
+                return True
+            if node_id is None:
+                log.debug('Node rejected by: %s', nf)
+                return False
+        return True
+
+    def merge(self, node):
+        """Merges provided Node into the underlying graph."""
+    
+        node = self._filter(node)
+        if node is None:
+            return
+
+        # Filters/mappers may produce new name instances - keep one instance per distinct name
+        intern = symbols.intern
+        node.id = intern(node.id)
+        node.connections = set(map(intern, node.connections))
        
         self._lock.acquire()
        
@@ -58,6 +94,13 @@ class Model(object):
         
         self._lock.release()
 
+    def clear(self):
+        """Removes all nodes (filters are kept)."""
+        with self._lock:
+            if not self._open:
+                raise AssertionError('Unable to clear() nodes: model was closed.')
+            del self.nodes[:]
+
     def remove_external_connections(self):
         """Removes external connections from all Nodes."""
         self._lock.acquire()
@@ -92,6 +135,123 @@ class Model(object):
         
         return len(external_nodes)
 
+class CompactModel(Model):
+    """A thread-safe data model storing nodes as symbol ids and connections as array-backed edge lists.
+
+    Intended for large graphs (e.g. member level dependencies). Node objects are only 
+    created transiently: for the filter chain on merge() and when nodes are requested.
+    """
+
+    def __init__(self):
+        """Initializes a new instance of the CompactModel class."""
+        
+        self._lock = threading.Lock()
+        self._open = True
+        self.node_filters = []
+        
+        self._node_index = {}
+        self._node_ids = array('I')
+        self._node_sizes = array('L')
+        self._node_external = bytearray()
+        self._edge_sources = array('I')
+        self._edge_targets = array('I')
+
+    def __len__(self):
+        """Returns the number of nodes."""
+        return len(self._node_ids)
+
+    @property
+    def nodes(self):
+        """Returns the graph as a list of (newly created) Node objects."""
+        name = symbols.name
+        connections = {}
+        for source_id, target_id in itertools.izip(self._edge_sources, self._edge_targets):
+            target_set = connections.get(source_id)
+            if target_set is None:
+                target_set = connections[source_id] = set()
+            target_set.add(name(target_id))
+        
+        return [Node(name(node_id), connections.get(node_id, ()), size, bool(external)) 
+                for (node_id, size, external) in itertools.izip(self._node_ids, self._node_sizes, self._node_external)]
+
+    def clear(self):
+        """Removes all nodes and edges (filters are kept)."""
+        with self._lock:
+            if not self._open:
+                raise AssertionError('Unable to clear() nodes: model was closed.')
+            self._node_index.clear()
+            for values in (self._node_ids, self._node_sizes, self._edge_sources, self._edge_targets):
+                del values[:]
+            del self._node_external[:]
+
+    @property
+    def edge_count(self):
+        """Returns the number of stored edges (duplicates included)."""
+        return len(self._edge_sources)
+
+    def merge(self, node):
+        """Merges provided Node into the underlying graph."""
+    
+        node = self._filter(node)
+        if node is None:
+            return
+
+        symbol_id = symbols.id
+        source_id = symbol_id(node.id)
+        target_ids = [symbol_id(it) for it in node.connections]
+
+        self._lock.acquire()
+        
+        if not self._open:
+            self._lock.release()
+            raise AssertionError('Unable to merge() node: model was closed.')
+
+        index = self._node_index.get(source_id)
+        if index is None:
+            self._node_index[source_id] = len(self._node_ids)
+            self._node_ids.append(source_id)
+            self._node_sizes.append(node.size)
+            self._node_external.append(0)
+        else:
+            self._node_sizes[index] += node.size
+        
+        self._edge_sources.extend([source_id] * len(target_ids))
+        self._edge_targets.extend(target_ids)
+        
+        self._lock.release()
+
+    def remove_external_connections(self):
+        """Removes external connections (and duplicate edges) from all Nodes."""
+        self._lock.acquire()
+
+        internal_ids = self._node_index
+        init_size = len(self._edge_sources)
+        edges = set(it for it in itertools.izip(self._edge_sources, self._edge_targets) if it[1] in internal_ids)
+        self._edge_sources = array('I', (it[0] for it in edges))
+        self._edge_targets = array('I', (it[1] for it in edges))
+
+        self._open = False
+        self._lock.release()
+
+        return init_size - len(edges)
+
+    def create_external_nodes(self):
+        """Creates nodes that are referenced through Node connections, but do not exist in the model."""
+        self._lock.acquire()
+
+        internal_ids = self._node_index
+        external_ids = set(it for it in self._edge_targets if it not in internal_ids)
+        for node_id in external_ids:
+            internal_ids[node_id] = len(self._node_ids)
+            self._node_ids.append(node_id)
+            self._node_sizes.append(0)
+            self._node_external.append(1)
+
+        self._open = False
+        self._lock.release()
+        
+        return len(external_ids)
+
 class Node(object):
     """A graph node."""
 
@@ -129,6 +289,12 @@ class NodeFilter(object):
         """Returns a processed instance of node or None, if it should be dropped."""
         return node
 
+    def filter_id(self, node_id):
+        """Returns a processed node id or None, if the node should be dropped. 
+
+        Returns NotImplemented, if the decision depends on more than the id."""
+        return NotImplemented
+
 
 class NodeIdFilter(NodeFilter):
     """Filters IDs using an external function."""
@@ -147,6 +313,13 @@ class NodeIdFilter(NodeFilter):
         node.connections = set(filter(self._id_filter, node.connections)) 
         return node
 
+    def filter_id(self, node_id):
+        assert self._id_filter
+        if not self._id_filter(node_id):
+            self._drop_count += 1
+            return None
+        return node_id
+
 
 class NodeIdMapper(NodeFilter):
     """Maps IDs using an external function."""
@@ -164,3 +337,8 @@ class NodeIdMapper(NodeFilter):
         self._map_count += 1
         return node
 
+    def filter_id(self, node_id):
+        # Not counted - accepted nodes are mapped again by filter_node()
+        assert self._id_mapper 
+        return self._id_mapper(node_id)
+
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import threading
+
+from collections import namedtuple
+
+log = logging.getLogger('quarantine')
+
+# A class or archive that failed to load. offset is the position of the problem within the 
+# class file or the archive (None if not known).
+QuarantineEntry = namedtuple('QuarantineEntry', 'origin offset reason')
+
+class ErrorBudgetExceeded(AssertionError):
+    """Raised when more errors than allowed were quarantined."""
+    pass
+
+class Quarantine(object):
+    """A thread-safe record of classes and archives skipped in continue-on-error mode.
+
+    Errors are recorded until there are more than budget of them (no limit if budget is None), 
+    then ErrorBudgetExceeded is raised.
+    """
+
+    def __init__(self, budget=None):
+        """Initializes a new instance of the Quarantine class."""
+        self._lock = threading.Lock()
+        self.budget = budget
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def add(self, origin, error, offset=None):
+        """Records an error raised while loading origin. ErrorBudgetExceeded errors are re-raised, not recorded."""
+        if isinstance(error, ErrorBudgetExceeded):
+            raise error
+        reason = '%s: %s' % (type(error).__name__, error)
+        log.warning('Quarantined: %s (%s)', origin, reason)
+        with self._lock:
+            self.entries.append(QuarantineEntry(origin, offset, reason))
+            errors = len(self.entries)
+        if self.budget is not None and errors > self.budget:
+            raise ErrorBudgetExceeded('Error budget exceeded (%d errors allowed): %s' % (self.budget, origin))
+
+    def summary(self):
+        """Returns (error type, count) tuples, most frequent first."""
+        counts = {}
+        for entry in self.entries:
+            error_type = entry.reason.partition(':')[0]
+            counts[error_type] = counts.get(error_type, 0) + 1
+        return sorted(counts.items(), key=lambda it: (-it[1], it[0]))
+
+    def write(self, f):
+        """Writes the report to a file object: origin, offset and reason separated by tabs, one entry per line."""
+        for entry in self.entries:
+            f.write('%s\t%s\t%s\n' % (entry.origin, entry.offset if entry.offset is not None else '-', entry.reason))
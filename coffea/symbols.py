@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import threading
+
+log = logging.getLogger('symbols')
+
+class SymbolTable(object):
+    """A thread-safe table of interned class and package names.
+
+    Every distinct name is stored once and gets a stable integer id. Derived names
+    (internal form to dotted class name, class name to package name) are cached.
+    """
+
+    def __init__(self):
+        """Initializes a new instance of the SymbolTable class."""
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._names = []
+        self._class_names = {}
+        self._packages = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def id(self, name):
+        """Returns the id of a name, adding it to the table if necessary."""
+        symbol_id = self._ids.get(name)
+        if symbol_id is None:
+            with self._lock:
+                symbol_id = self._ids.get(name)
+                if symbol_id is None:
+                    symbol_id = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = symbol_id
+        return symbol_id
+
+    def name(self, symbol_id):
+        """Returns the name registered under the specified id."""
+        return self._names[symbol_id]
+
+    def intern(self, name):
+        """Returns the canonical instance of a name."""
+        symbol_id = self._ids.get(name)
+        if symbol_id is None:
+            symbol_id = self.id(name)
+        return self._names[symbol_id]
+
+    def class_name(self, internal_name):
+        """Converts an internal class name (java/lang/String) to an interned dotted one (java.lang.String)."""
+        class_name = self._class_names.get(internal_name)
+        if class_name is None:
+            class_name = self._class_names[internal_name] = self.intern(internal_name.replace('/', '.'))
+        return class_name
+
+    def package(self, class_name):
+        """Returns the interned package name of a dotted class name ('' for the default package)."""
+        package = self._packages.get(class_name)
+        if package is None:
+            package = self._packages[class_name] = self.intern(class_name.rpartition('.')[0])
+        return package
+
+    def clear(self):
+        """Removes all names. Ids handed out so far become invalid."""
+        with self._lock:
+            self._ids.clear()
+            del self._names[:]
+            self._class_names.clear()
+            self._packages.clear()
+
+# Process-wide symbol table
+symbols = SymbolTable()
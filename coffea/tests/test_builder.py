@@ -17,13 +17,40 @@
 #
 
 import mock
+import os
+import shutil
+import tarfile
 import tempfile
 import unittest
 
-from coffea.builder import Builder, PackageNodeFactory, ClassNodeFactory
+from coffea.builder import Builder, PackageNodeFactory, ClassNodeFactory, MemberNodeFactory, ArtifactNodeFactory
+from coffea.model import CompactModel, Model, NodeIdFilter, NodeIdMapper
+from coffea.java.java_class import JavaClass, PARSE_CODE_SIZE, PARSE_DEPENDENCIES
+from coffea.java.java_scanner import PathFilter
+from coffea.java.tests.test_artifact import write_jar
+from coffea.java.tests.test_java_class import module_info_class
+from coffea.quarantine import ErrorBudgetExceeded, Quarantine
+from coffea.java.tests import __file__ as java_test_directory
+
+java_data_dir = os.path.join(os.path.dirname(java_test_directory), 'data')
+
+def read_class(name):
+    """Returns the content of a sample class file."""
+    with open(os.path.join(java_data_dir, name), 'rb') as f:
+        return f.read()
 
 class TestBuilder(unittest.TestCase):
 
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _jar(self, name, entries, manifest=None):
+        """Writes a jar with (name, content) entries to the temporary directory."""
+        return write_jar(os.path.join(self._tmpdir, name), manifest, entries)
+
     def test_append(self):
         with mock.patch('coffea.builder.JavaClass') as JavaClass:
             instance = JavaClass.return_value
@@ -75,4 +102,215 @@ class TestBuilder(unittest.TestCase):
         self.assertEqual(factory.get_node(java_class).size, 100) 
         
         factory.size_property = 'code'
-        self.assertEqual(factory.get_node(java_class).size, 50) 
+        self.assertEqual(factory.get_node(java_class).size, 50)
+
+    def test_parse_mode(self):
+        factory = ClassNodeFactory()
+        self.assertEqual(factory.parse_mode, PARSE_DEPENDENCIES)
+        
+        factory.size_property = 'class'
+        self.assertEqual(factory.parse_mode, PARSE_DEPENDENCIES)
+        
+        factory.size_property = 'code'
+        self.assertEqual(factory.parse_mode, PARSE_CODE_SIZE)
+
+    def test_hierarchy(self):
+        builder = Builder()
+        builder.append(java_data_dir)
+        
+        self.assertEqual(len(builder.hierarchy), 2)
+        self.assertEqual(builder.hierarchy.subtypes('java.io.Serializable'), set(['SimplePOJO', 'Java8Sample']))
+        self.assertEqual(builder.hierarchy.supertypes('SimplePOJO'), set(['java.lang.Object', 'java.io.Serializable']))
+
+    def test_member_node_factory(self):
+        java_class = mock.MagicMock()
+        java_class.name, java_class.size = 'Test', 100
+        java_class.member_dependencies = mock.MagicMock(return_value=['com.example.Service#run()V', 'com.example.Model#id'])
+       
+        factory = MemberNodeFactory(size_property='class')
+        node = factory.get_node(java_class)
+
+        self.assertEqual(node.id, 'Test')
+        self.assertEqual(node.connections, set(['com.example.Service#run()V', 'com.example.Model#id']))
+        self.assertEqual(node.size, 100)
+        self.assertIsInstance(factory.create_model(), CompactModel)
+        self.assertNotIsInstance(ClassNodeFactory().create_model(), CompactModel)
+
+        java_class.fields = [mock.MagicMock(descriptor='I')]
+        java_class.fields[0].name = 'id'
+        java_class.methods = [mock.MagicMock(descriptor='()V')]
+        java_class.methods[0].name = 'run'
+        nodes = factory.get_nodes(java_class)
+        self.assertEqual([(it.id, it.connections) for it in nodes[1:]], [('Test#id', set()), ('Test#run()V', set())])
+        self.assertEqual(nodes[0].id, 'Test')
+
+    def test_member_mode(self):
+        builder = Builder(MemberNodeFactory())
+        self.assertIsInstance(builder.model, CompactModel)
+        
+        builder.append(java_data_dir)
+        # Classes and their declared members
+        self.assertEqual(len(builder.model), 23)
+        self.assertIn('SimplePOJO#name', [it.id for it in builder.model.nodes])
+        self.assertGreater(builder.model.create_external_nodes(), 10)
+        external = set(it.id for it in builder.model.nodes if it.external)
+        self.assertIn('java.io.PrintStream#println(Ljava/lang/String;)V', external)
+        self.assertFalse([it for it in external if it.startswith(('SimplePOJO#', 'Java8Sample#'))])
+
+        # References to members of scanned classes are internal
+        builder = Builder(MemberNodeFactory())
+        builder.append(java_data_dir)
+        builder.model.remove_external_connections()
+        connections = dict((it.id, it.connections) for it in builder.model.nodes)
+        self.assertIn('SimplePOJO#name', connections['SimplePOJO'])
+        self.assertEqual(sum(len(it) for it in connections.values()), 14)
+
+    def test_append_archive(self):
+        jar = self._jar('sample.jar', [('SimplePOJO.class', read_class('SimplePOJO.class')), 
+                                       ('com/example/Java8Sample.class', read_class('Java8Sample.class'))])
+
+        builder = Builder(ClassNodeFactory(size_property='class'))
+        builder.append(jar)
+
+        self.assertEqual(sorted(it.id for it in builder.model.nodes), ['Java8Sample', 'SimplePOJO'])
+        self.assertEqual(sum(it.size for it in builder.model.nodes), 1455 + 2463)
+
+    def test_class_cache(self):
+        entries = [('SimplePOJO.class', read_class('SimplePOJO.class')), 
+                   ('com/example/Java8Sample.class', read_class('Java8Sample.class'))]
+        self._jar('sample.jar', entries)
+        self._jar('sample-all.jar', entries + [('com/example/shaded/SimplePOJO.class', read_class('SimplePOJO.class'))])
+
+        def build(class_cache, class_cache_size=None):
+            builder = Builder(ClassNodeFactory(size_property='class'), class_cache=class_cache)
+            if class_cache_size is not None:
+                builder.class_cache_size = class_cache_size
+            builder.append(self._tmpdir)
+            return builder
+
+        self.assertIsNone(Builder().class_cache)
+
+        cached = build(True)
+        self.assertEqual(cached.class_cache_hits, 2)
+        self.assertEqual(cached.class_cache_misses, 3)
+
+        uncached = build(False)
+        self.assertEqual(uncached.class_cache_hits, 0)
+        self.assertEqual(uncached.class_cache_misses, 0)
+
+        bounded = build(True, 1)
+        self.assertEqual(len(bounded.class_cache), 1)
+        self.assertEqual(bounded.class_cache_hits + bounded.class_cache_misses, 5)
+
+        nodes = lambda builder: sorted((it.id, sorted(it.connections), it.size) for it in builder.model.nodes)
+        self.assertEqual(nodes(cached), nodes(uncached))
+        self.assertEqual(nodes(bounded), nodes(uncached))
+
+    def test_path_filter(self):
+        builder = Builder(path_filter=PathFilter(exclude=['*/SimplePOJO.class']))
+        builder.append(java_data_dir)
+        self.assertEqual([it.id for it in builder.model.nodes], ['Java8Sample'])
+
+    def test_multi_release(self):
+        jar = self._jar('sample.jar', [(root + 'SimplePOJO.class', read_class('SimplePOJO.class')) for root in ['', 'META-INF/versions/9/', 'META-INF/versions/11/']], 
+                        [('Manifest-Version', '1.0'), ('Multi-Release', 'true')])
+
+        for release in [None, 8, 17]:
+            builder = Builder(ClassNodeFactory(size_property='class'), release=release)
+            builder.append(jar)
+            # One copy parsed, the node size is not a sum of all versions
+            self.assertEqual([(it.id, it.size) for it in builder.model.nodes], [('SimplePOJO', 1455)])
+
+    def test_quarantine(self):
+        data = read_class('SimplePOJO.class')
+        # Unknown constant pool tag in the first entry (offset 10) and a truncated class
+        jar = self._jar('sample.jar', [('SimplePOJO.class', data), ('UnknownTag.class', data[:10] + '\x15' + data[11:]), 
+                                       ('Truncated.class', data[:100])])
+
+        quarantine = Quarantine()
+        builder = Builder(quarantine=quarantine)
+        builder.append(jar)
+        self.assertEqual([it.id for it in builder.model.nodes], ['SimplePOJO'])
+        self.assertEqual(sorted((it.origin, it.offset) for it in quarantine), 
+                         [(jar + '!/Truncated.class', 100), (jar + '!/UnknownTag.class', 10)])
+
+        self.assertRaises(ErrorBudgetExceeded, Builder(quarantine=Quarantine(budget=1)).append, jar)
+        self.assertRaises(AssertionError, Builder().append, jar)
+
+    def test_artifact_mode(self):
+        app_dir = os.path.join(self._tmpdir, 'app')
+        lib_dir = os.path.join(self._tmpdir, 'lib')
+        os.makedirs(app_dir)
+        os.makedirs(lib_dir)
+        app = self._jar('app.jar', [('module-info.class', module_info_class('com.example.app', ['java.base', 'com.example.util'])),
+                                    ('com/example/Main.class', '')])
+        with open(app, 'rb') as f:
+            self._jar('app/app.war', [('WEB-INF/lib/app.jar', f.read())])
+        self._jar('lib/bundle.jar', [], [('Import-Package', 'com.example.util;version="1.0",org.osgi.framework'), ('Class-Path', 'app.jar')])
+        self._jar('lib/util.jar', [('com/example/util/Strings.class', '')], 
+                  [('Automatic-Module-Name', 'com.example.util'), ('Export-Package', 'com.example.util')])
+
+        builder = Builder(ArtifactNodeFactory(size_property='class'))
+        with mock.patch.object(JavaClass, 'from_bytes', wraps=JavaClass.from_bytes) as from_bytes:
+            builder.append(app_dir)
+            # References to archives appended later are resolved then
+            builder.append(lib_dir)
+        # Only the module descriptor is parsed
+        self.assertEqual(from_bytes.call_count, 1)
+
+        nodes = sorted((it.id, sorted(it.connections), it.size) for it in builder.model.nodes)
+        self.assertEqual(nodes, [('app.jar', ['java.base', 'util.jar'], 2), ('app.war', [], 0), 
+                                 ('bundle.jar', ['app.jar', 'org.osgi.framework', 'util.jar'], 0), ('util.jar', [], 1)])
+        self.assertEqual(builder.model.create_external_nodes(), 2)
+
+    def test_node_filters_skip_parsing(self):
+        jar = self._jar('sample.jar', [('SimplePOJO.class', read_class('SimplePOJO.class')), ('Java8Sample.class', read_class('Java8Sample.class'))])
+
+        for factory, expected in [(ClassNodeFactory(), ['x.SimplePOJO']), (PackageNodeFactory(), [])]:
+            builder = Builder(factory)
+            # Mapper first - filters see mapped ids
+            builder.model.node_filters.append(NodeIdMapper(lambda it: 'x.' + it))
+            builder.model.node_filters.append(NodeIdFilter(lambda it: it.startswith('x.Simple')))
+
+            with mock.patch.object(JavaClass, 'from_bytes', wraps=JavaClass.from_bytes) as from_bytes:
+                builder.append(jar)
+
+            self.assertEqual([it.id for it in builder.model.nodes], expected)
+            self.assertEqual(from_bytes.call_count, len(expected))
+            self.assertEqual(builder.model.node_filters[1]._drop_count, 2 - len(expected))
+
+    def test_node_filters_bundles(self):
+        product_dir = os.path.join(self._tmpdir, 'product-1.0')
+        os.makedirs(os.path.join(product_dir, 'classes'))
+        os.makedirs(os.path.join(product_dir, 'lib'))
+        for name in ['SimplePOJO.class', 'Java8Sample.class']:
+            shutil.copy(os.path.join(java_data_dir, name), os.path.join(product_dir, 'classes'))
+        self._jar('product-1.0/lib/sample.jar', [('SimplePOJO.class', read_class('SimplePOJO.class')), 
+                                                  ('Java8Sample.class', read_class('Java8Sample.class'))])
+
+        tar = os.path.join(self._tmpdir, 'product-1.0.tar.gz')
+        with tarfile.open(tar, 'w:gz') as tf:
+            tf.add(product_dir, 'product-1.0')
+        bundle = self._jar('product-1.0.zip', [(os.path.relpath(os.path.join(root, name), self._tmpdir), open(os.path.join(root, name), 'rb').read())
+                                               for root, dirs, files in os.walk(product_dir) for name in files])
+
+        for path in [product_dir, tar, bundle]:
+            builder = Builder(ClassNodeFactory())
+            builder.model.node_filters.append(NodeIdFilter(lambda it: it.startswith('SimplePOJO')))
+            with mock.patch.object(JavaClass, 'from_bytes', wraps=JavaClass.from_bytes) as from_bytes:
+                builder.append(path)
+            # Bundle entries are parsed and filtered as nodes, Java8Sample.class in the jar is rejected up front
+            self.assertEqual([it.id for it in builder.model.nodes], ['SimplePOJO'])
+            self.assertEqual(from_bytes.call_count, 3)
+
+    def test_node_filters_unknown_root(self):
+        ear = self._jar('sample.ear', [('APP-INF/classes/SimplePOJO.class', read_class('SimplePOJO.class')),
+                                       ('APP-INF/classes/Java8Sample.class', read_class('Java8Sample.class'))])
+
+        builder = Builder(ClassNodeFactory())
+        builder.model.node_filters.append(NodeIdFilter(lambda it: it.startswith('Simple')))
+        with mock.patch.object(JavaClass, 'from_bytes', wraps=JavaClass.from_bytes) as from_bytes:
+            builder.append(ear)
+        # Class names can't be derived from an unknown ear root - the entries are filtered as nodes
+        self.assertEqual([it.id for it in builder.model.nodes], ['SimplePOJO'])
+        self.assertEqual(from_bytes.call_count, 2)
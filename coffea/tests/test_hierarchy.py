@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+
+from coffea.hierarchy import HierarchyIndex
+from coffea.symbols import SymbolTable
+
+class TestHierarchyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = HierarchyIndex(SymbolTable())
+        self.index.add('com.example.Base', 'java.lang.Object', ['java.io.Serializable'])
+        self.index.add('com.example.Service', None, [])
+        self.index.add('com.example.ServiceImpl', 'com.example.Base', ['com.example.Service'])
+        self.index.add('com.example.ServiceImplEx', 'com.example.ServiceImpl')
+        self.index.add('com.example.Other', 'java.lang.Object')
+
+    def test_direct(self):
+        self.assertEqual(self.index.parents('com.example.ServiceImpl'), set(['com.example.Base', 'com.example.Service']))
+        self.assertEqual(self.index.children('java.lang.Object'), set(['com.example.Base', 'com.example.Other']))
+        self.assertEqual(self.index.children('com.example.ServiceImplEx'), set())
+        self.assertEqual(self.index.parents('com.example.Unknown'), set())
+
+    def test_subtypes(self):
+        self.assertEqual(self.index.subtypes('com.example.Service'), set(['com.example.ServiceImpl', 'com.example.ServiceImplEx']))
+        self.assertEqual(self.index.subtypes('java.io.Serializable'), set(['com.example.Base', 'com.example.ServiceImpl', 'com.example.ServiceImplEx']))
+        self.assertEqual(self.index.subtypes('com.example.Unknown'), set())
+
+    def test_supertypes(self):
+        self.assertEqual(self.index.supertypes('com.example.ServiceImplEx'), set(['com.example.ServiceImpl', 
+                                                                                  'com.example.Base',
+                                                                                  'com.example.Service',
+                                                                                  'java.lang.Object',
+                                                                                  'java.io.Serializable']))
+        self.assertEqual(self.index.supertypes('java.lang.Object'), set())
+
+    def test_duplicates(self):
+        self.assertEqual(len(self.index), 5)
+        self.index.add('com.example.ServiceImpl', 'com.example.Base', ['com.example.Service'])
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(len(self.index._children[self.index._symbols.id('com.example.Base')]), 1)
+        self.assertTrue('com.example.ServiceImpl' in self.index)
+        self.assertFalse('java.lang.Object' in self.index)
@@ -19,7 +19,8 @@
 import mock
 import unittest
 
-from coffea.model import Model, Node, NodeIdFilter, NodeIdMapper
+from coffea.model import CompactModel, Model, Node, NodeFilter, NodeIdFilter, NodeIdMapper
+from coffea.symbols import symbols
 
 class TestModel(unittest.TestCase):
 
@@ -63,6 +64,25 @@ class TestModel(unittest.TestCase):
         self.assertEquals(model.nodes[1].id, 'NODE2')
         self.assertEquals(model.nodes[0].connections, set(['NODE2']))
     
+    def test_accepts(self):
+        model = Model()
+        self.assertTrue(model.accepts('node1'))
+
+        id_filter = NodeIdFilter(lambda node_id: node_id.startswith('x.'))
+        model.node_filters.append(NodeIdMapper(lambda node_id: 'x.' + node_id[2:]))
+        model.node_filters.append(id_filter)
+        model.node_filters.append(NodeIdFilter(lambda node_id: node_id != 'x.node2'))
+        self.assertTrue(model.accepts('a.node1'))
+        self.assertFalse(model.accepts('a.node2'))
+        self.assertEquals(model.node_filters[0]._map_count, 0)
+        self.assertEquals(model.node_filters[2]._drop_count, 1)
+
+        class SizeFilter(NodeFilter):
+            def filter_node(self, node):
+                return node if node.size > 0 else None
+        model.node_filters.insert(0, SizeFilter())
+        self.assertTrue(model.accepts('a.node2'))
+
     def test_remove_external_connections(self):
         model = Model()
         nodes = [Node('node0', ['node1', 'node2', 'ext0']), 
@@ -114,3 +134,75 @@ class TestModel(unittest.TestCase):
         node = Node('sample')
         self.assertEquals(str(node), 'sample')
 
+    def test_merge_interns_names(self):
+        model = Model()
+        model.node_filters.append(NodeIdMapper(lambda node_id: node_id.replace('org.', '')))
+
+        model.merge(Node('org.node0', ['org.node1']))
+        model.merge(Node('org.node1', ['org.node0']))
+        
+        self.assertIs(model.nodes[0].id, symbols.intern('node0'))
+        self.assertIs(list(model.nodes[1].connections)[0], model.nodes[0].id)
+
+
+class TestCompactModel(unittest.TestCase):
+
+    def _merge(self, model):
+        nodes = [Node('node0', ['node1', 'ext0#m()V'], 40), 
+                 Node('node1', ['ext1#f']), 
+                 Node('node2', size=5),
+                 Node('node0', ['node2', 'ext0#m()V'], 10)]
+        for n in nodes:
+            model.merge(n)
+        return model
+
+    def test_merge(self):
+        model = self._merge(CompactModel())
+
+        self.assertEquals(len(model), 3)
+        self.assertEquals(model.edge_count, 5)
+        
+        nodes = model.nodes
+        self.assertEquals([it.id for it in nodes], ['node0', 'node1', 'node2'])
+        self.assertEquals(nodes[0].connections, set(['node1', 'node2', 'ext0#m()V']))
+        self.assertEquals(nodes[0].size, 50)
+        self.assertEquals(nodes[1].connections, set(['ext1#f']))
+        self.assertEquals(nodes[2].connections, set())
+        self.assertEquals(nodes[2].size, 5)
+
+    def test_node_filters(self):
+        model = CompactModel()
+        model.node_filters.append(NodeIdFilter(lambda node_id: not node_id.startswith('ext1')))
+        model.node_filters.append(NodeIdMapper(lambda node_id: node_id.upper()))
+        self._merge(model)
+        
+        self.assertEquals([it.id for it in model.nodes], ['NODE0', 'NODE1', 'NODE2'])
+        self.assertEquals(model.nodes[1].connections, set())
+
+    def test_clear(self):
+        for model in [Model(), CompactModel()]:
+            self._merge(model)
+            model.clear()
+            self.assertEquals(len(model), 0)
+            self.assertEquals(model.nodes, [])
+            model.merge(Node('node3', ['node0'], 5))
+            self.assertEquals([(it.id, it.connections, it.size) for it in model.nodes], [('node3', set(['node0']), 5)])
+
+            model.create_external_nodes()
+            self.assertRaises(AssertionError, model.clear)
+
+    def test_remove_external_connections(self):
+        model = self._merge(CompactModel())
+        
+        self.assertEqual(model.remove_external_connections(), 3)
+        self.assertEquals(model.edge_count, 2)
+        self.assertEquals(model.nodes[0].connections, set(['node1', 'node2']))
+        self.assertRaises(AssertionError, model.merge, Node('node3'))
+
+    def test_create_external_nodes(self):
+        model = self._merge(CompactModel())
+
+        self.assertEqual(model.create_external_nodes(), 2)
+        self.assertEquals(len(model), 5)
+        self.assertEquals(sorted(it.id for it in model.nodes if it.external), ['ext0#m()V', 'ext1#f'])
+        self.assertRaises(AssertionError, model.merge, Node('node3'))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import StringIO
+import unittest
+
+from coffea.quarantine import ErrorBudgetExceeded, Quarantine, QuarantineEntry
+
+class TestQuarantine(unittest.TestCase):
+
+    def test_add(self):
+        quarantine = Quarantine()
+        quarantine.add('a.jar!/A.class', AssertionError('Unknown tag: 21'), 10)
+        quarantine.add('b.jar', IOError('Permission denied'))
+        quarantine.add('c.jar', AssertionError('Invalid archive'))
+
+        self.assertEqual(len(quarantine), 3)
+        self.assertEqual(list(quarantine)[0], QuarantineEntry('a.jar!/A.class', 10, 'AssertionError: Unknown tag: 21'))
+        self.assertEqual(quarantine.summary(), [('AssertionError', 2), ('IOError', 1)])
+
+        report = StringIO.StringIO()
+        quarantine.write(report)
+        self.assertEqual(report.getvalue().splitlines(), ['a.jar!/A.class\t10\tAssertionError: Unknown tag: 21',
+                                                          'b.jar\t-\tIOError: Permission denied',
+                                                          'c.jar\t-\tAssertionError: Invalid archive'])
+
+    def test_budget(self):
+        quarantine = Quarantine(budget=1)
+        quarantine.add('a.jar', AssertionError('Invalid archive'))
+        self.assertRaises(ErrorBudgetExceeded, quarantine.add, 'b.jar', AssertionError('Invalid archive'))
+        self.assertEqual(len(quarantine), 2)
+
+        # Not recorded again when an outer handler sees it
+        self.assertRaises(ErrorBudgetExceeded, quarantine.add, 'c.jar', ErrorBudgetExceeded('Error budget exceeded'))
+        self.assertEqual(len(quarantine), 2)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2013 Szymon Biliński 
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import unittest
+
+from coffea.symbols import SymbolTable, symbols
+
+class TestSymbolTable(unittest.TestCase):
+
+    def test_ids(self):
+        table = SymbolTable()
+        
+        self.assertEqual(table.id('java.lang'), 0)
+        self.assertEqual(table.id('java.lang.String'), 1)
+        self.assertEqual(table.id('java.lang'), 0)
+        self.assertEqual(table.name(1), 'java.lang.String')
+        self.assertEqual(len(table), 2)
+        self.assertTrue('java.lang' in table)
+        self.assertFalse('java.util' in table)
+
+        table.clear()
+        self.assertEqual(len(table), 0)
+
+    def test_intern(self):
+        table = SymbolTable()
+        first = ''.join(['org.jboss.', 'logging'])
+        second = ''.join(['org.jboss.', 'logging'])
+        self.assertIsNot(first, second)
+        
+        self.assertIs(table.intern(first), first)
+        self.assertIs(table.intern(second), first)
+
+    def test_derived_names(self):
+        table = SymbolTable()
+
+        class_name = table.class_name('java/lang/String')
+        self.assertEqual(class_name, 'java.lang.String')
+        self.assertIs(table.class_name('java/lang/String'), class_name)
+        self.assertIs(table.intern('java.lang.String'), class_name)
+
+        self.assertEqual(table.package(class_name), 'java.lang')
+        self.assertIs(table.package('java.lang.Integer'), table.package(class_name))
+        self.assertEqual(table.package('SimplePOJO'), '')
+
+    def test_concurrent_ids(self):
+        table = SymbolTable()
+        names = ['name%d' % i for i in range(1000)]
+        
+        def register():
+            for n in names:
+                table.id(n)
+        
+        threads = [threading.Thread(target=register) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(table), len(names))
+        self.assertEqual(sorted(table.name(table.id(n)) for n in names), sorted(names))
+
+    def test_process_wide_table(self):
+        self.assertIsInstance(symbols, SymbolTable)